@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+"""
+ Insteon Capture Analysis
+ loads a TX/RX capture file written by captureSerial (insteonCapture) into
+ structured NumPy arrays and computes per-device round trip times, hop
+ usage, NAK and timeout rates and the power line utilisation with array
+ operations, so days of traffic are analysed in seconds.  The capture is
+ walked once to split the RX bytes into PLM messages, everything after
+ that works on whole arrays.
+
+ Message fields (messageType):
+    time:      host time of the TX write or of the read completing the RX
+               message, seconds since the epoch
+    record:    index of that capture record, the order of the traffic
+    direction: CAPTURE_TX or CAPTURE_RX
+    code:      IM code, e.g. 0x62 send, 0x50 standard, 0x51 extended
+    address:   device address as an integer (0x002B8E for 00.2B.8E), the
+               to address of 0x62 and the from address of 0x50/0x51, else 0
+    flags, cmd1, cmd2: message flags and commands, 0 if the code has none
+    ack:       last byte of a 0x62 echo, 0x06 accepted or 0x15 busy
+
+ Transaction fields (transactionType), one per 0x62 sent by the host:
+    time, address, cmd1: of the command sent
+    status:    STATUS_OK, STATUS_NAK (device NAK), STATUS_TIMEOUT (no reply
+               from the device) or STATUS_PLM (the PLM didn't take it)
+    rtt:       seconds from the write to the device reply, NaN if none
+    hops:      hops the reply used (max hops - hops left), -1 if none
+
+ Needs numpy (pip install numpy), unlike the rest of the library.
+
+ Functions:
+    LoadCapture: capture file to an array of messages
+    Transactions: pairs each command sent with its echo and device reply
+    DeviceStats: per-device counts, rates, round trip times and hops
+    Utilisation: fraction of power line time in use per interval
+
+ History:
+    October 2026 - first version
+ """
+
+import json, sys
+from insteonCapture import ReadCapture, CAPTURE_TX, CAPTURE_RX
+from insteonDeviceClasses import imMessageLengths, AddressText
+
+try:
+    import numpy
+except ImportError:
+    raise ImportError("the capture analysis needs numpy: pip install numpy")
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+messageType = numpy.dtype(
+    [
+        ("time", "<f8"),
+        ("record", "<u4"),
+        ("direction", "u1"),
+        ("code", "u1"),
+        ("address", "<u4"),
+        ("flags", "u1"),
+        ("cmd1", "u1"),
+        ("cmd2", "u1"),
+        ("ack", "u1"),
+    ]
+)
+transactionType = numpy.dtype(
+    [
+        ("time", "<f8"),
+        ("address", "<u4"),
+        ("cmd1", "u1"),
+        ("status", "u1"),
+        ("rtt", "<f8"),
+        ("hops", "i1"),
+    ]
+)
+
+STATUS_OK = 0
+STATUS_NAK = 1
+STATUS_TIMEOUT = 2
+STATUS_PLM = 3
+
+# power line time of one hop of a message, 60 Hz: a standard message is 6
+# zero crossings, an extended one 13, and every hop repeats the message
+STD_AIRTIME = 0.050
+EXT_AIRTIME = 0.10833
+
+
+def _Address(data):
+    return (ord(data[0]) << 16) | (ord(data[1]) << 8) | ord(data[2])
+
+
+def _Message(time, record, direction, data):
+    # one messageType tuple from a complete message
+    code = ord(data[1])
+    if (code == 0x62) and (len(data) >= 8):
+        ack = ord(data[-1]) if direction == CAPTURE_RX else 0
+        return (
+            time,
+            record,
+            direction,
+            code,
+            _Address(data[2:5]),
+            ord(data[5]),
+            ord(data[6]),
+            ord(data[7]),
+            ack,
+        )
+    if code in [0x50, 0x51]:
+        return (
+            time,
+            record,
+            direction,
+            code,
+            _Address(data[2:5]),
+            ord(data[8]),
+            ord(data[9]),
+            ord(data[10]),
+            0,
+        )
+    return (time, record, direction, code, 0, 0, 0, 0, 0)
+
+
+def LoadCapture(fileName):
+    # returns a messageType array of every message in the capture, in the
+    # order of the traffic
+    records = ReadCapture(fileName)
+    messages = []
+    rxIndex = []
+    rxData = []
+    for [iRecord, [t, direction, data]] in enumerate(records):
+        if direction == CAPTURE_TX:
+            # the host writes one whole command at a time
+            if (len(data) >= 2) and (data[0] == chr(0x02)):
+                messages.append(_Message(t, iRecord, CAPTURE_TX, data))
+        else:
+            rxIndex.append(iRecord)
+            rxData.append(data)
+    # the reads split the RX bytes anywhere, so they are joined and split
+    # again at the message boundaries, each message taking the time of the
+    # read that completed it
+    rx = "".join(rxData)
+    rxEnds = numpy.cumsum([len(data) for data in rxData])
+    ends = []
+    rxMessages = []
+    iChar = rx.find(chr(0x02))
+    while (iChar >= 0) and (iChar + 2 <= len(rx)):
+        code = ord(rx[iChar + 1])
+        length = imMessageLengths.get(code)
+        if length is None:
+            iChar = rx.find(chr(0x02), iChar + 1)
+            continue
+        if (code == 0x62) and (iChar + 6 <= len(rx)) and (ord(rx[iChar + 5]) & 0x10):
+            length = length + 14
+        if iChar + length > len(rx):
+            break
+        rxMessages.append(rx[iChar : iChar + length])
+        ends.append(iChar + length)
+        iChar = rx.find(chr(0x02), iChar + length)
+    iRead = numpy.searchsorted(rxEnds, ends, "left")
+    for [data, i] in zip(rxMessages, iRead):
+        iRecord = rxIndex[i]
+        messages.append(_Message(records[iRecord][0], iRecord, CAPTURE_RX, data))
+    messages = numpy.array(messages, dtype=messageType)
+    return messages[numpy.argsort(messages["record"], kind="mergesort")]
+
+
+def _NextSame(keys, positions):
+    # for keys sorted by address then position, the position of the next
+    # entry with the same address, the end of the capture if there is none
+    size = len(keys)
+    following = numpy.empty(size, numpy.int64)
+    following[:-1] = positions[1:]
+    following[-1:] = numpy.iinfo(numpy.int64).max
+    last = numpy.ones(size, bool)
+    last[:-1] = (keys[1:] >> 32) <> (keys[:-1] >> 32)
+    following[last] = numpy.iinfo(numpy.int64).max
+    return following
+
+
+def Transactions(messages):
+    # pairs every 0x62 written by the host with the PLM echo that follows
+    # it and with the first direct ACK or NAK from the same device before
+    # the next command to that device, returns a transactionType array
+    positions = numpy.arange(len(messages), dtype=numpy.int64)
+    isTx = (messages["direction"] == CAPTURE_TX) & (messages["code"] == 0x62)
+    isEcho = (messages["direction"] == CAPTURE_RX) & (messages["code"] == 0x62)
+    messageClass = messages["flags"] >> 5
+    isReply = (
+        (messages["direction"] == CAPTURE_RX)
+        & ((messages["code"] == 0x50) | (messages["code"] == 0x51))
+        & ((messageClass == 1) | (messageClass == 5))
+    )
+    tx = messages[isTx]
+    txPos = positions[isTx]
+    result = numpy.zeros(len(tx), dtype=transactionType)
+    result["time"] = tx["time"]
+    result["address"] = tx["address"]
+    result["cmd1"] = tx["cmd1"]
+    result["rtt"] = numpy.nan
+    result["hops"] = -1
+    if not len(tx):
+        return result
+
+    # key of address and position, sorted by address and then position
+    txKey = (tx["address"].astype(numpy.int64) << 32) | txPos
+    order = numpy.argsort(txKey)
+    nextTx = numpy.empty(len(tx), numpy.int64)
+    nextTx[order] = _NextSame(txKey[order], txPos[order])
+
+    # the echo is the next 0x62 from the PLM, before the next command sent
+    echoPos = positions[isEcho]
+    echoes = messages[isEcho]
+    iEcho = numpy.searchsorted(echoPos, txPos)
+    found = iEcho < len(echoPos)
+    iEcho = numpy.minimum(iEcho, max(len(echoPos) - 1, 0))
+    if len(echoPos):
+        nextAny = numpy.append(txPos[1:], numpy.iinfo(numpy.int64).max)
+        found &= echoPos[iEcho] < nextAny
+        found &= echoes["address"][iEcho] == tx["address"]
+        accepted = found & (echoes["ack"][iEcho] == 0x06)
+    else:
+        accepted = found
+    result["status"][~accepted] = STATUS_PLM
+
+    # the reply is the first from the device before its next command
+    replies = messages[isReply]
+    replyKey = (replies["address"].astype(numpy.int64) << 32) | positions[isReply]
+    replyOrder = numpy.argsort(replyKey)
+    replyKey = replyKey[replyOrder]
+    replies = replies[replyOrder]
+    iReply = numpy.searchsorted(replyKey, txKey)
+    answered = iReply < len(replyKey)
+    iReply = numpy.minimum(iReply, max(len(replyKey) - 1, 0))
+    if len(replyKey):
+        answered &= (replyKey[iReply] >> 32) == (txKey >> 32)
+        answered &= (replyKey[iReply] & 0xFFFFFFFF) < nextTx
+    answered &= accepted
+    result["status"][accepted & ~answered] = STATUS_TIMEOUT
+    if len(replyKey):
+        matched = replies[iReply]
+        nak = answered & ((matched["flags"] >> 5) == 5)
+        result["status"][nak] = STATUS_NAK
+        result["rtt"][answered] = matched["time"][answered] - tx["time"][answered]
+        hops = (matched["flags"] & 0x03) - ((matched["flags"] >> 2) & 0x03)
+        result["hops"][answered] = hops[answered]
+    return result
+
+
+def DeviceStats(transactions, percentiles=(50, 90, 99)):
+    # dictionary by address text of the counts, rates, round trip time
+    # statistics and hop histogram of each device
+    addresses = transactions["address"]
+    [devices, inverse] = numpy.unique(addresses, return_inverse=True)
+    nDevices = len(devices)
+    status = transactions["status"]
+    counts = numpy.bincount(inverse, minlength=nDevices)
+    byStatus = [
+        numpy.bincount(inverse[status == value], minlength=nDevices)
+        for value in [STATUS_OK, STATUS_NAK, STATUS_TIMEOUT, STATUS_PLM]
+    ]
+    hopCounts = numpy.zeros((nDevices, 4), numpy.int64)
+    used = transactions["hops"] >= 0
+    numpy.add.at(hopCounts, (inverse[used], transactions["hops"][used] & 0x03), 1)
+
+    # round trip times grouped by device, each group sorted
+    answered = ~numpy.isnan(transactions["rtt"])
+    rtt = transactions["rtt"][answered]
+    group = inverse[answered]
+    order = numpy.lexsort((rtt, group))
+    rtt = rtt[order]
+    bounds = numpy.searchsorted(group[order], numpy.arange(nDevices + 1))
+
+    stats = {}
+    for iDevice in range(nDevices):
+        address = int(devices[iDevice])
+        count = int(counts[iDevice])
+        [ok, nak, timeout, plm] = [int(c[iDevice]) for c in byStatus]
+        sent = max(count - plm, 1)
+        deviceRtt = rtt[bounds[iDevice] : bounds[iDevice + 1]]
+        entry = {
+            "count": count,
+            "ok": ok,
+            "nak": nak,
+            "timeout": timeout,
+            "plmNak": plm,
+            "nakRate": nak / float(sent),
+            "timeoutRate": timeout / float(sent),
+            "hops": [int(n) for n in hopCounts[iDevice]],
+            "rttMean": None,
+            "rttPercentiles": {},
+        }
+        if len(deviceRtt):
+            entry["rttMean"] = float(deviceRtt.mean())
+            values = numpy.percentile(deviceRtt, percentiles)
+            for [p, value] in zip(percentiles, values):
+                entry["rttPercentiles"][p] = float(value)
+        key = AddressText([address >> 16, (address >> 8) & 0xFF, address & 0xFF])
+        stats[key] = entry
+    return stats
+
+
+def Utilisation(messages, interval=60.0):
+    # fraction of the power line time in use in each interval, from the
+    # commands the PLM accepted and the messages it heard.  Returns [start
+    # times of the intervals, fractions]
+    sentOrHeard = (messages["direction"] == CAPTURE_RX) & (
+        ((messages["code"] == 0x62) & (messages["ack"] == 0x06))
+        | (messages["code"] == 0x50)
+        | (messages["code"] == 0x51)
+    )
+    heard = messages[sentOrHeard]
+    if not len(heard):
+        return [numpy.zeros(0), numpy.zeros(0)]
+    flags = heard["flags"]
+    airtime = numpy.where(flags & 0x10, EXT_AIRTIME, STD_AIRTIME) * (
+        (flags & 0x03) + 1
+    )
+    start = numpy.floor(messages["time"].min() / interval) * interval
+    bins = ((heard["time"] - start) // interval).astype(numpy.int64)
+    busy = numpy.bincount(bins, weights=airtime)
+    return [start + interval * numpy.arange(len(busy)), busy / interval]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) <> 2:
+        print >> sys.stderr, "usage: insteonAnalysis.py CAPTURE_FILE"
+        sys.exit(2)
+    stats = DeviceStats(Transactions(LoadCapture(sys.argv[1])))
+    print json.dumps(stats, indent=1, sort_keys=True)
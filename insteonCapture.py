@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+"""
+ Insteon Traffic Capture
+ provides a recording wrapper around the PLM serial handle and a replay
+ transport which serves recorded traffic back to the device classes in
+ insteonDeviceClasses, either at the recorded speed or as fast as possible.
+
+ Classes:
+    captureSerial: serial handle wrapper that records all TX/RX bytes
+    replaySerial: serial handle stand-in that replays a capture file
+
+ Functions:
+    ReadCapture: loads a capture file into a list of records
+
+ Capture file format (all values little endian):
+    header: 8 byte magic "INSTCAP1"
+    records: 11 byte record header followed by the data bytes
+        double:  host timestamp in seconds since the epoch
+        uint8:   direction, CAPTURE_TX (host to PLM) or CAPTURE_RX
+        uint16:  number of data bytes that follow
+
+ History:
+    October 2026 - first version
+ """
+
+import struct
+from insteonDeviceClasses import clock
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+CAPTURE_MAGIC = "INSTCAP1"
+CAPTURE_TX = 0
+CAPTURE_RX = 1
+recordHeader = struct.Struct("<dBH")
+
+
+def ReadCapture(fileName):
+    # loads a capture file and returns a list of [timestamp, direction, data]
+    # records in the order they were written
+    # fileName: path to a capture file written by captureSerial
+    captureFile = open(fileName, "rb")
+    try:
+        buf = captureFile.read()
+    finally:
+        captureFile.close()
+    if buf[: len(CAPTURE_MAGIC)] <> CAPTURE_MAGIC:
+        print "ERROR: not an Insteon capture file:", fileName
+        return []
+    records = []
+    iChar = len(CAPTURE_MAGIC)
+    while iChar + recordHeader.size <= len(buf):
+        [t, direction, length] = recordHeader.unpack_from(buf, iChar)
+        iChar += recordHeader.size
+        records.append([t, direction, buf[iChar : iChar + length]])
+        iChar += length
+    return records
+
+
+class captureSerial:
+    """
+    Recording wrapper for the serial port handle of the PLM
+    Pass an instance of this class anywhere a PLM serial handle is used
+    (StdCmd, ExtCrc, ExtChecksum and the device class methods) and every
+    byte written to or read from the PLM is appended to the capture file
+    with a timestamp.  Anything other than write() and read() is passed
+    straight through to the wrapped handle.
+
+    VALUES:
+    ser:
+        the wrapped serial port handle
+    captureFile:
+        open file object receiving the capture records
+    nRecords:
+        number of records written so far
+
+    METHODS:
+    write(data)
+        records data as TX and writes it to the PLM
+    read(size)
+        reads from the PLM and records whatever arrived as RX
+    close()
+        closes the capture file and the wrapped serial handle
+    """
+
+    def __init__(self, ser, fileName):
+        self.__dict__["ser"] = ser
+        self.__dict__["captureFile"] = open(fileName, "wb")
+        self.__dict__["nRecords"] = 0
+        self.captureFile.write(CAPTURE_MAGIC)
+
+    def __getattr__(self, name):
+        return getattr(self.ser, name)
+
+    def __setattr__(self, name, value):
+        # attributes such as timeout belong to the wrapped handle
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self.ser, name, value)
+
+    def _Record(self, direction, data):
+        self.captureFile.write(recordHeader.pack(clock.time(), direction, len(data)))
+        self.captureFile.write(data)
+        self.__dict__["nRecords"] = self.nRecords + 1
+
+    def write(self, data):
+        self._Record(CAPTURE_TX, data)
+        return self.ser.write(data)
+
+    def read(self, size=1):
+        data = self.ser.read(size)
+        # an empty read is a timeout, which the replay reproduces on its own
+        if data:
+            self._Record(CAPTURE_RX, data)
+        return data
+
+    def flushCapture(self):
+        self.captureFile.flush()
+
+    def close(self):
+        if not self.captureFile.closed:
+            self.captureFile.close()
+        self.ser.close()
+
+
+class replaySerial:
+    """
+    Serial port handle stand-in which replays a capture file
+    Each write() from the host consumes the next recorded TX record and
+    each read() is served from the RX records that followed it.  A read
+    which asks for more bytes than were recorded before the next TX record
+    returns short, exactly as the serial timeout did on the live system.
+
+    VALUES:
+    records:
+        list of [timestamp, direction, data] loaded from the capture file
+    realtime:
+        True replays with the recorded gaps between records, False replays
+        as fast as possible
+    speed:
+        playback speed multiplier used when realtime is True
+    mismatches:
+        number of host writes which did not match the recorded TX bytes
+    timeout:
+        accepted for compatibility with the serial handle, not used
+
+    METHODS:
+    write(data)
+        consumes the next recorded TX record
+    read(size)
+        returns up to size recorded RX bytes
+    flushInput()
+        discards any buffered RX bytes
+    flushOutput()
+        no action
+    Rewind()
+        starts the replay again from the first record
+    Done()
+        True when every record has been served
+    """
+
+    timeout = 2
+
+    def __init__(self, fileName, realtime=False, speed=1.0):
+        self.records = ReadCapture(fileName)
+        self.realtime = realtime
+        self.speed = float(speed)
+        self.Rewind()
+
+    def Rewind(self):
+        self.iRecord = 0
+        self.rxBuffer = ""
+        self.mismatches = 0
+        self.lastRecordTime = None
+        self.lastServeTime = None
+
+    def Done(self):
+        return self.iRecord >= len(self.records) and not self.rxBuffer
+
+    def _Pace(self, t):
+        # hold back a record until the recorded gap since the previous one has passed
+        if self.realtime and self.lastRecordTime is not None:
+            wait = (t - self.lastRecordTime) / self.speed
+            wait = wait - (clock.time() - self.lastServeTime)
+            if wait > 0:
+                clock.sleep(wait)
+        self.lastRecordTime = t
+        self.lastServeTime = clock.time()
+
+    def write(self, data):
+        # skip anything the host did not read last time around, then consume the TX
+        while (self.iRecord < len(self.records)) and (
+            self.records[self.iRecord][1] <> CAPTURE_TX
+        ):
+            self.iRecord += 1
+        if self.iRecord >= len(self.records):
+            self.mismatches += 1
+            return len(data)
+        [t, direction, recorded] = self.records[self.iRecord]
+        self.iRecord += 1
+        if recorded <> data:
+            self.mismatches += 1
+        self._Pace(t)
+        return len(data)
+
+    def read(self, size=1):
+        while (len(self.rxBuffer) < size) and (self.iRecord < len(self.records)):
+            [t, direction, data] = self.records[self.iRecord]
+            if direction == CAPTURE_TX:
+                break
+            self.iRecord += 1
+            self._Pace(t)
+            self.rxBuffer = self.rxBuffer + data
+        data = self.rxBuffer[:size]
+        self.rxBuffer = self.rxBuffer[size:]
+        return data
+
+    def flushInput(self):
+        self.rxBuffer = ""
+
+    def flushOutput(self):
+        pass
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def isOpen(self):
+        return True
@@ -6,15 +6,37 @@
  through a power line modem (PLM) to the device instances.
 
  Classes:
+    insteonDevice: common base of the device classes
     dimmer: Insteon device class for dimmers
     thermostat: Insteon device class for dimmers
+    deviceEvent: event delivered to subscribers
+    rttEstimator: per-device round trip time statistics
+    deviceBreaker: per-device circuit breakers for unreachable devices
+    systemClock: the host clock
+    virtualClock: simulated clock for tests and simulations
+    stdMessage: view of a received standard message
+    extMessage: view of a received extended message
 
  Functions:
     CalcCrcStr: calculates the Insteon extended command two byte CRC
     ExtCrc: sends an Insteon extended CRC command and gets the response
     ExtChecksum: sends an Insteon extended CS command and gets the response
     StdCmd: sends an Insteon standard command and gets the response
+    GroupCmd: sends an ALL-Link command to a PLM group
+    ReadMessage: reads one complete message from the PLM
+    MessageView: view of a received standard or extended message
     betterErrorChecking:  reports errors/recovery only when things change
+    Subscribe: registers a callback or queue for device events
+    Unsubscribe: removes a subscription
+    EmitEvent: delivers an event to the subscribers
+    ClockOffset: offset of a thermostat day and time from the host clock
+    EnableAdaptiveTimeouts: per-device reply timeouts from measured round trips
+    DisableAdaptiveTimeouts: back to the serial port timeout for every device
+    EnableBreakers: fail fast on devices that stopped answering
+    DisableBreakers: every command goes to the device again
+    SyncThermostatClocks: sets the clocks of thermostats that have drifted
+    AddressText: formats an address as written on the device label
+    SetClock: changes the clock used for all timing in the library
 
  History:
     December 2014 - first version
@@ -23,7 +45,7 @@
     January 2020 - add get and set time data and method for thermostat class
  """
 
-import time, datetime
+import time, datetime, threading
 
 # consider updating this to the form:
 # from time import sleep
@@ -37,11 +59,106 @@ __email__ = "david.boertjes@gmail.com"
 __status__ = "Production"
 
 
+class systemClock(object):
+    """
+    The host clock, used by default
+
+    METHODS:
+    time()
+        seconds since the epoch, as time.time()
+    sleep(seconds)
+        waits, as time.sleep()
+    now()
+        local date and time, as datetime.datetime.now()
+    """
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def now(self):
+        return datetime.datetime.now()
+
+
+class virtualClock(object):
+    """
+    Simulated clock for tests and simulations with a simulated PLM
+    sleep() returns straight away and moves the clock forward instead, so
+    a schedule push or a long fleet operation runs in milliseconds.
+
+    VALUES:
+    current:
+        the simulated time in seconds since the epoch (default now)
+    slept:
+        total seconds of sleep() calls
+
+    METHODS:
+    time(), sleep(seconds), now()
+        as systemClock
+    Advance(seconds)
+        moves the clock forward without counting it as sleep
+    """
+
+    def __init__(self, start=None):
+        if start is None:
+            start = time.time()
+        self.current = float(start)
+        self.slept = 0.0
+        self.lock = threading.Lock()
+
+    def time(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.lock.acquire()
+        self.current += max(seconds, 0)
+        self.slept += max(seconds, 0)
+        self.lock.release()
+
+    def Advance(self, seconds):
+        self.lock.acquire()
+        self.current += seconds
+        self.lock.release()
+
+    def now(self):
+        return datetime.datetime.fromtimestamp(self.current)
+
+
+class clockSelector(object):
+    # the clock all the timing of the library goes through.  Modules import
+    # this one object, SetClock() changes the clock behind it.
+    def __init__(self, source):
+        self.source = source
+
+    def time(self):
+        return self.source.time()
+
+    def sleep(self, seconds):
+        self.source.sleep(seconds)
+
+    def now(self):
+        return self.source.now()
+
+
+clock = clockSelector(systemClock())
+
+
+def SetClock(source):
+    # uses source (systemClock(), virtualClock() or anything with time(),
+    # sleep() and now()) for all the timing of the library, returns the
+    # clock used before
+    previous = clock.source
+    clock.source = source
+    return previous
+
+
 def errorReporting(address, errorText, localError, errorStatus, verbose):
     if localError:
         if (errorStatus == False) and verbose:
             print "ERROR: Readback length fail"
-            print "   ", datetime.datetime.now()
+            print "   ", clock.now()
             print "    set address ", hex(address[0])[2:] + "." + hex(address[1])[
                 2:
             ] + "." + hex(address[2])[2:] + " on " + errorText
@@ -49,13 +166,537 @@ def errorReporting(address, errorText, localError, errorStatus, verbose):
     else:
         if (errorStatus == True) and verbose:
             print "INFO: Readback recovery"
-            print "   ", datetime.datetime.now()
+            print "   ", clock.now()
             print "    set address ", hex(address[0])[2:] + "." + hex(address[1])[
                 2:
             ] + "." + hex(address[2])[2:] + " on " + errorText
         return False
 
 
+# device event kinds
+EVENT_CHANGE = "change"
+EVENT_ERROR = "error"
+EVENT_COMPLETE = "complete"
+
+# list of [target, kinds, device] registered through Subscribe
+subscribers = []
+
+
+class deviceEvent(object):
+    """
+    Event delivered to subscribers
+
+    VALUES:
+    kind:
+        EVENT_CHANGE when a watched device field changed value
+        EVENT_ERROR when errorStatus changed value
+        EVENT_COMPLETE when a device command finished
+    device:
+        the dimmer or thermostat instance
+    field:
+        name of the field that changed, or the command text for
+        EVENT_COMPLETE
+    old:
+        previous value, None for EVENT_COMPLETE
+    new:
+        new value, errorStatus after the command for EVENT_COMPLETE
+    time:
+        host clock.time() of the event
+    """
+
+    __slots__ = ("kind", "device", "field", "old", "new", "time")
+
+    def __init__(self, kind, device, field, old, new):
+        self.kind = kind
+        self.device = device
+        self.field = field
+        self.old = old
+        self.new = new
+        self.time = clock.time()
+
+
+def Subscribe(target, kinds=None, device=None):
+    # registers a subscriber for device events and returns the subscription
+    # to pass to Unsubscribe
+    # target: callable taking a deviceEvent, or a Queue.Queue style object
+    #   with a put() method
+    # kinds: list of event kinds wanted, None for all
+    # device: only events from this device instance, None for all devices
+    subscription = [target, kinds, device]
+    subscribers.append(subscription)
+    return subscription
+
+
+def Unsubscribe(subscription):
+    if subscription in subscribers:
+        subscribers.remove(subscription)
+
+
+def EmitEvent(kind, device, field, old, new):
+    # delivers an event to every matching subscriber, in the calling thread
+    event = deviceEvent(kind, device, field, old, new)
+    for [target, kinds, onlyDevice] in list(subscribers):
+        if (kinds is not None) and (kind not in kinds):
+            continue
+        if (onlyDevice is not None) and (onlyDevice is not device):
+            continue
+        try:
+            if hasattr(target, "put"):
+                target.put(event)
+            else:
+                target(event)
+        except Exception, e:
+            print "ERROR: event subscriber failed: " + str(e)
+
+
+class rttEstimator:
+    """
+    Per-device round trip time statistics for the read timeouts
+    Keeps a smoothed round trip time and its mean deviation for each device
+    address, as in TCP's retransmission timeout (RFC 6298), and gives the
+    read timeout for the device reply as srtt + 4 * rttvar within the
+    minTimeout and maxTimeout bounds.  After a missed reply the timeout is
+    doubled, up to maxTimeout, until the device answers again.
+
+    VALUES:
+    minTimeout:
+        shortest reply timeout in seconds (default 0.3)
+    maxTimeout:
+        longest reply timeout in seconds, also used for devices without a
+        measurement yet (default 2)
+    stats:
+        dictionary by 3 character address string of [srtt, rttvar, backoff]
+
+    METHODS:
+    Timeout(address)
+        reply timeout in seconds for the device at address
+    Update(address, rtt)
+        adds a measured round trip time in seconds
+    Failed(address)
+        notes a reply that never arrived
+    """
+
+    def __init__(self, minTimeout=0.3, maxTimeout=2.0):
+        self.minTimeout = minTimeout
+        self.maxTimeout = maxTimeout
+        self.stats = {}
+
+    def Timeout(self, address):
+        if address not in self.stats:
+            return self.maxTimeout
+        [srtt, rttvar, backoff] = self.stats[address]
+        timeout = (srtt + 4 * rttvar) * backoff
+        return min(max(timeout, self.minTimeout), self.maxTimeout)
+
+    def Update(self, address, rtt):
+        if address not in self.stats:
+            self.stats[address] = [rtt, rtt / 2.0, 1]
+        else:
+            [srtt, rttvar, backoff] = self.stats[address]
+            rttvar = 0.75 * rttvar + 0.25 * abs(srtt - rtt)
+            srtt = 0.875 * srtt + 0.125 * rtt
+            self.stats[address] = [srtt, rttvar, 1]
+
+    def Failed(self, address):
+        if address in self.stats:
+            self.stats[address][2] = min(self.stats[address][2] * 2, 64)
+
+
+# set by EnableAdaptiveTimeouts, None leaves the serial port timeout alone
+rttStats = None
+
+
+def EnableAdaptiveTimeouts(minTimeout=0.3, maxTimeout=2.0):
+    # turns on per-device reply timeouts in StdCmd, ExtCrc and ExtChecksum,
+    # returns the rttEstimator holding the statistics
+    global rttStats
+    rttStats = rttEstimator(minTimeout, maxTimeout)
+    return rttStats
+
+
+def DisableAdaptiveTimeouts():
+    global rttStats
+    rttStats = None
+
+
+def _Received(cmdEcho, echoLength, complete):
+    # the received value for DeviceDone: a command the PLM didn't take says
+    # nothing about the device
+    if (len(cmdEcho) <> echoLength) or (cmdEcho[-1] <> chr(0x06)):
+        return None
+    return complete
+
+
+def DeviceTimeout(ser, address):
+    # sets the serial read timeout for the reply from the device at address,
+    # returns the timeout to restore afterwards (None if nothing was changed)
+    if rttStats is None:
+        return None
+    savedTimeout = ser.timeout
+    timeout = rttStats.Timeout(address)
+    if timeout <> savedTimeout:
+        ser.timeout = timeout
+    return savedTimeout
+
+
+def DeviceDone(ser, address, savedTimeout, sent, received):
+    # restores the serial read timeout and updates the statistics
+    # received: True if the full reply arrived, False if not, None if the
+    #   transaction failed for reasons that say nothing about the device
+    if breakers is not None:
+        breakers.Update(address, received)
+    if savedTimeout is None:
+        return
+    if ser.timeout <> savedTimeout:
+        ser.timeout = savedTimeout
+    if received:
+        rttStats.Update(address, time.time() - sent)
+    elif received is not None:
+        rttStats.Failed(address)
+
+
+class deviceBreaker:
+    """
+    Per-device circuit breakers for unreachable devices
+    Counts the replies in a row each device address has missed.  After
+    threshold of them the breaker of the device opens and its commands fail
+    straight away, without waiting out the read timeout on the power line.
+    When the probe interval has passed the next command to the device first
+    sends a single status request (0x19 0x00): an answer closes the breaker,
+    no answer doubles the interval, up to maxInterval.
+
+    VALUES:
+    threshold:
+        missed replies in a row that open the breaker (default 3)
+    minInterval:
+        seconds from opening to the first probe (default 30)
+    maxInterval:
+        longest seconds between probes (default 900)
+    stats:
+        dictionary by 3 character address string of [failures, interval,
+        nextProbe], interval is 0 while the breaker is closed
+
+    METHODS:
+    Allow(ser, address)
+        True if a command may be sent to the device at address, probes the
+        device first if its breaker is open and the probe is due
+    Update(address, received)
+        notes a reply that arrived (True) or not (False)
+    IsOpen(address)
+        True while the breaker of the device is open
+    State(address)
+        dictionary of failures, open and nextProbe of the device at address,
+        given as a 3 character string or a list of 3 integers
+    Reset(address)
+        closes the breaker of the device
+    """
+
+    def __init__(self, threshold=3, minInterval=30, maxInterval=900):
+        self.threshold = threshold
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.stats = {}
+        # address to the thread sending its probe
+        self.probing = {}
+        self.lock = threading.Lock()
+
+    def IsOpen(self, address):
+        return self.stats.get(address, [0, 0, 0])[1] > 0
+
+    def Allow(self, ser, address):
+        now = clock.time()
+        self.lock.acquire()
+        try:
+            if self.probing.get(address) is threading.current_thread():
+                # the probe itself
+                return True
+            if not self.IsOpen(address):
+                return True
+            if (address in self.probing) or (now < self.stats[address][2]):
+                return False
+            # not probed again before the interval, even if the probe fails
+            # without saying anything about the device
+            self.stats[address][2] = now + self.stats[address][1]
+            self.probing[address] = threading.current_thread()
+        finally:
+            self.lock.release()
+        try:
+            StdCmd(
+                ser, chr(0x02) + chr(0x62) + address + chr(0x0F) + chr(0x19) + chr(0x00)
+            )
+        finally:
+            self.lock.acquire()
+            del self.probing[address]
+            self.lock.release()
+        return not self.IsOpen(address)
+
+    def Update(self, address, received):
+        if received is None:
+            return
+        self.lock.acquire()
+        try:
+            if received:
+                if address in self.stats:
+                    del self.stats[address]
+                return
+            stats = self.stats.setdefault(address, [0, 0, 0])
+            stats[0] += 1
+            if stats[1] > 0:
+                stats[1] = min(stats[1] * 2, self.maxInterval)
+            elif stats[0] >= self.threshold:
+                stats[1] = self.minInterval
+            else:
+                return
+            stats[2] = clock.time() + stats[1]
+        finally:
+            self.lock.release()
+
+    def State(self, address):
+        if not isinstance(address, str):
+            address = "".join(chr(value) for value in address)
+        [failures, interval, nextProbe] = self.stats.get(address, [0, 0, 0])
+        return {
+            "failures": failures,
+            "open": interval > 0,
+            "nextProbe": nextProbe if interval > 0 else None,
+        }
+
+    def Reset(self, address):
+        self.lock.acquire()
+        if address in self.stats:
+            del self.stats[address]
+        self.lock.release()
+
+
+# set by EnableBreakers, None sends every command to the device
+breakers = None
+
+
+def EnableBreakers(threshold=3, minInterval=30, maxInterval=900):
+    # turns on the per-device circuit breakers in StdCmd, ExtCrc and
+    # ExtChecksum, returns the deviceBreaker holding their state
+    global breakers
+    breakers = deviceBreaker(threshold, minInterval, maxInterval)
+    return breakers
+
+
+def DisableBreakers():
+    global breakers
+    breakers = None
+
+
+def DeviceBlocked(ser, address, verbose):
+    # True if the breaker of the device at address is open, the command is
+    # then not sent
+    if (breakers is None) or breakers.Allow(ser, address):
+        return False
+    if verbose:
+        print "ERROR: device " + AddressText(
+            [ord(c) for c in address]
+        ) + " not answering, command not sent"
+    return True
+
+
+def GroupCmd(ser, group, cmd1, cmd2=0x00, verbose=False):
+    # sends an ALL-Link command to a PLM group and waits for the PLM to
+    # finish the cleanup messages to the responders
+    # response string and error boolean returned in list
+    # ser: serial port handle of the PLM
+    # group: PLM ALL-Link group number, 0 to 255
+    # cmd1, cmd2: Insteon command, e.g. 0x11 (on) or 0x13 (off)
+    #   the command string has the following format:
+    #   1st byte (all commands start with this value):  0x02
+    #   2nd byte (code): 0x61 --> Send ALL-Link Command
+    #   3rd byte: ALL-Link group
+    #   4th byte: Command 1
+    #   5th byte: Command 2
+    #   the PLM echoes the command with an ACK (0x06) and then reports the
+    #   end of the cleanups with an ALL-Link Cleanup Status Report (0x58)
+    cmdStr = chr(0x02) + chr(0x61) + chr(group) + chr(cmd1) + chr(cmd2)
+    ser.write(cmdStr)
+    try:
+        cmdEcho = ser.read(6)
+        report = ReadMessage(ser)
+        while report and (report[1] <> chr(0x58)):
+            # cleanup ACKs from the responders
+            report = ReadMessage(ser)
+    except:
+        if verbose:
+            print "ERROR: GroupCmd read error"
+        return ["", True]
+    if (len(cmdEcho) <> 6) or (cmdEcho[-1] <> chr(0x06)):
+        if verbose:
+            print "ERROR: GroupCmd no ACK from PLM"
+            print "cmdStr   " + ":".join("{:02x}".format(ord(c)) for c in cmdStr)
+            print "cmdEcho  " + ":".join("{:02x}".format(ord(c)) for c in cmdEcho)
+        ser.flushInput()
+        ser.flushOutput()
+        return ["", True]
+    # a cleanup report of 0x15 means at least one responder didn't answer
+    cleanupErr = (not report) or (report[-1] <> chr(0x06))
+    if verbose:
+        print ":".join("{:02x}".format(ord(c)) for c in cmdStr)
+        print ":".join("{:02x}".format(ord(c)) for c in cmdEcho)
+        print ":".join("{:02x}".format(ord(c)) for c in report)
+    return [report, cleanupErr]
+
+
+# total length of each PLM message, by IM code.  0x62 is the echo of a
+# standard message, an extended one is 14 characters longer.
+imMessageLengths = {
+    0x50: 11,
+    0x51: 25,
+    0x52: 4,
+    0x53: 10,
+    0x54: 3,
+    0x55: 2,
+    0x56: 7,
+    0x57: 10,
+    0x58: 3,
+    0x60: 9,
+    0x61: 6,
+    0x62: 9,
+    0x64: 5,
+    0x65: 3,
+    0x66: 6,
+    0x67: 3,
+    0x68: 4,
+    0x69: 3,
+    0x6A: 3,
+    0x6B: 4,
+    0x6C: 3,
+    0x6D: 3,
+    0x6E: 3,
+    0x6F: 12,
+    0x70: 4,
+    0x71: 5,
+    0x72: 3,
+    0x73: 6,
+}
+
+
+def ReadMessage(ser):
+    # reads one complete message from the PLM and returns it, or "" if
+    # nothing complete arrived before the serial timeout.  Anything before
+    # the 0x02 start byte, such as a lone NAK (0x15) from a busy PLM, is
+    # skipped.
+    start = ser.read(1)
+    while start and (start <> chr(0x02)):
+        start = ser.read(1)
+    if not start:
+        return ""
+    code = ser.read(1)
+    if not code:
+        return ""
+    length = imMessageLengths.get(ord(code))
+    if length is None:
+        return start + code
+    if ord(code) == 0x62:
+        # address and flags first, the flags tell standard from extended
+        message = start + code + ser.read(4)
+        if (len(message) == 6) and (ord(message[5]) & 0x10):
+            length = length + 14
+        message = message + ser.read(length - len(message))
+    else:
+        message = start + code + ser.read(length - 2)
+    if len(message) <> length:
+        return ""
+    return message
+
+
+class stdMessage(object):
+    """
+    View of a standard message (0x50) received from the PLM
+    Nothing is copied or decoded until a value is asked for.  An empty or
+    short message gives a view whose valid is False.
+
+    VALUES:
+    frame:
+        memoryview of the 11 bytes of the message
+    code:
+        IM command code, 0x50
+    fromAddress, toAddress:
+        addresses as lists of 3 integers
+    flags:
+        message flags byte
+    messageType:
+        flags bits 7-5, 0x20 direct ACK, 0xA0 direct NAK, 0x80 broadcast
+    isAck, isNak, isExtended:
+        True for a direct ACK, a direct NAK or an extended message
+    hopsLeft, maxHops:
+        hops remaining and the hops the message started with
+    cmd1, cmd2:
+        command bytes, in a reply to a query cmd2 holds the answer
+    valid:
+        True if the frame is complete and has the expected code
+    """
+
+    __slots__ = ("frame",)
+    length = 11
+    expectedCode = 0x50
+
+    def __init__(self, message, offset=0):
+        # offset selects one message of the concatenated replies StdCmd
+        # returns for nResponse > 1
+        self.frame = memoryview(message)[offset : offset + self.length]
+
+    def _Byte(self, index):
+        return ord(self.frame[index])
+
+    def _Address(self, index):
+        return [ord(c) for c in self.frame[index : index + 3]]
+
+    code = property(lambda self: self._Byte(1))
+    fromAddress = property(lambda self: self._Address(2))
+    toAddress = property(lambda self: self._Address(5))
+    flags = property(lambda self: self._Byte(8))
+    messageType = property(lambda self: self._Byte(8) & 0xE0)
+    isAck = property(lambda self: self.messageType == 0x20)
+    isNak = property(lambda self: self.messageType == 0xA0)
+    isExtended = property(lambda self: bool(self._Byte(8) & 0x10))
+    hopsLeft = property(lambda self: (self._Byte(8) >> 2) & 0x03)
+    maxHops = property(lambda self: self._Byte(8) & 0x03)
+    cmd1 = property(lambda self: self._Byte(9))
+    cmd2 = property(lambda self: self._Byte(10))
+
+    @property
+    def valid(self):
+        return (len(self.frame) == self.length) and (
+            self._Byte(1) == self.expectedCode
+        )
+
+
+class extMessage(stdMessage):
+    """
+    View of an extended message (0x51) received from the PLM
+    Has the values of stdMessage plus the 14 bytes of user data.
+
+    VALUES:
+    userData:
+        memoryview of D1 through D14, use .tobytes() for a string copy
+
+    METHODS:
+    Data(n)
+        user data byte Dn, n from 1 to 14
+    """
+
+    __slots__ = ()
+    length = 25
+    expectedCode = 0x51
+
+    userData = property(lambda self: self.frame[11:25])
+
+    def Data(self, n):
+        return ord(self.frame[10 + n])
+
+
+def MessageView(message, offset=0):
+    # view of a received 0x50 or 0x51 message, picked from its code byte
+    if message[offset + 1 : offset + 2] == chr(0x51):
+        return extMessage(message, offset)
+    return stdMessage(message, offset)
+
+
 def CalcCrcStr(dataStr):
     # calculates the Insteon extended command two byte CRC
     # dataStr should contain the cmd1 through data12
@@ -118,20 +759,37 @@ def ExtCrc(ser, cmdStr, verbose=False, extreadback=True):
         return ["", True]
     # this CRC is not the CRC that is used in all Insteon messaging on the wire or RF.  It
     # is additional robustness which can help cover the serial connection from host to PLM.
+    if DeviceBlocked(ser, cmdStr[2:5], verbose):
+        return ["", True]
     crcStr = CalcCrcStr(cmdStr[-14:])
     tempStr = cmdStr + crcStr
     ser.write(tempStr)
+    sent = time.time()
+    savedTimeout = None
     try:
         cmdEcho = ser.read(23)
+        savedTimeout = DeviceTimeout(ser, tempStr[2:5])
         stdAck = ser.read(11)
         if extreadback:
             response = ser.read(25)
         else:
             response = ""
     except:
+        DeviceDone(ser, tempStr[2:5], savedTimeout, sent, None)
         if verbose:
             print "ERROR: ExtCrc read error"
         return ["", True]
+    DeviceDone(
+        ser,
+        tempStr[2:5],
+        savedTimeout,
+        sent,
+        _Received(
+            cmdEcho,
+            23,
+            (len(stdAck) == 11) and ((not extreadback) or (len(response) == 25)),
+        ),
+    )
     if extreadback:
         lr = len(response) <> 25
     else:
@@ -214,21 +872,36 @@ def ExtChecksum(ser, cmdStr, verbose=False, extreadback=True):
     # take the last byte of the sum, bitwise complement, then add 1 (and take last byte)
     # details can be found in the following document:
     # http://cache.insteon.com/developer/i2CSdev-022012-en.pdf
+    if DeviceBlocked(ser, cmdStr[2:5], verbose):
+        return ["", True]
     checksum = chr((((sum(bytearray(cmdStr[-15:])) % 256) ^ 0xFF) + 0x01) % 256)
     tempStr = cmdStr + checksum
     ser.write(tempStr)
+    sent = time.time()
+    savedTimeout = None
     try:
         if extreadback:
             len_response = 25
         else:
             len_response = 0
         cmdEcho = ser.read(23)
+        savedTimeout = DeviceTimeout(ser, tempStr[2:5])
         stdAck = ser.read(11)
         response = ser.read(len_response)
     except:
+        DeviceDone(ser, tempStr[2:5], savedTimeout, sent, None)
         if verbose:
             print "ERROR: ExtChecksum read error"
         return ["", True]
+    DeviceDone(
+        ser,
+        tempStr[2:5],
+        savedTimeout,
+        sent,
+        _Received(
+            cmdEcho, 23, (len(stdAck) == 11) and (len(response) == len_response)
+        ),
+    )
     if (len(cmdEcho) <> 23) or (len(stdAck) <> 11) or (len(response) <> len_response):
         if verbose:
             print "ERROR: ExtChecksum read error - wrong number of characters"
@@ -282,16 +955,31 @@ def StdCmd(ser, cmdStr, verbose=False, nResponse=1):
     if len(cmdStr) <> 8:
         print "ERROR: StdCmd input command not 8 characters"
         return ["", True]
+    if DeviceBlocked(ser, cmdStr[2:5], verbose):
+        return ["", True]
     ser.write(cmdStr)
+    sent = time.time()
+    savedTimeout = None
     try:
         cmdEcho = ser.read(9)
         response = ""
+        if nResponse > 0:
+            savedTimeout = DeviceTimeout(ser, cmdStr[2:5])
         for iResponse in range(nResponse):
             response = response + ser.read(11)
     except:
+        DeviceDone(ser, cmdStr[2:5], savedTimeout, sent, None)
         if verbose:
             print "ERROR: StdCmd read error"
         return ["", True]
+    if nResponse > 0:
+        DeviceDone(
+            ser,
+            cmdStr[2:5],
+            savedTimeout,
+            sent,
+            _Received(cmdEcho, 9, len(response) == 11 * nResponse),
+        )
     if (len(cmdEcho) <> 9) or (len(response) <> 11 * nResponse):
         if verbose:
             print "ERROR: StdCmd read error - wrong number of characters"
@@ -326,7 +1014,141 @@ def StdCmd(ser, cmdStr, verbose=False, nResponse=1):
     return [response, False]
 
 
-class dimmer:
+def ClockOffset(day, hour, minute, second, hostTime):
+    # returns the offset in seconds of a thermostat day and time from the
+    # host local time hostTime, wrapped to within half a week
+    week = 7 * 24 * 3600
+    now = datetime.datetime.fromtimestamp(hostTime)
+    hostSeconds = (
+        (now.isoweekday() % 7) * 86400 + now.hour * 3600 + now.minute * 60 + now.second
+    )
+    deviceSeconds = day * 86400 + hour * 3600 + minute * 60 + second
+    offset = (deviceSeconds - hostSeconds) % week
+    if offset > week / 2:
+        offset = offset - week
+    return offset
+
+
+def SyncThermostatClocks(
+    thermostats,
+    plmSerial,
+    threshold=10,
+    maxAge=3600,
+    settingsAge=300,
+    queue=None,
+    timeout=300,
+):
+    # sets the clock of every thermostat whose predicted error is more than
+    # threshold seconds, returns the list of thermostats that were written
+    # thermostats: list of thermostat instances
+    # plmSerial: serial port handle of the PLM, not used if queue is given
+    # threshold: largest acceptable clock error in seconds
+    # maxAge: readings older than this (seconds) are refreshed with GetTime
+    #   before deciding, unless a drift estimate is available to predict from
+    # settingsAge: SetTime writes back the other settings of the data set, a
+    #   read younger than this (seconds) is reused for them instead of a new read
+    # queue: optional commandQueue (insteonQueue) to send the commands through
+    # timeout: seconds the commands sent through queue may take in all, those
+    #   not done by then are taken off the queue and reported as timed out
+    deadline = time.time() + timeout
+    now = clock.time()
+    toRead = [
+        t
+        for t in thermostats
+        if (t.PredictClockError(now) is None)
+        or ((now - t.timeUpdate > maxAge) and (t.clockDrift == 0.0))
+    ]
+    _RunAll([[t, "GetTime", ()] for t in toRead], plmSerial, queue, deadline)
+    now = clock.time()
+    toWrite = []
+    for t in thermostats:
+        error = t.PredictClockError(now)
+        if (error is not None) and (abs(error) > threshold):
+            toWrite.append(t)
+    unfinished = _RunAll(
+        [[t, "SyncTime", (settingsAge,)] for t in toWrite], plmSerial, queue, deadline
+    )
+    return [t for t in toWrite if not (t.errorStatus or t in unfinished)]
+
+
+def _RunAll(calls, plmSerial, queue, deadline):
+    # runs [device, method, args] calls directly or through a commandQueue,
+    # returns the devices whose command through the queue wasn't done by the
+    # deadline (host time.time()), these are reported as timed out
+    if queue is None:
+        for [device, method, args] in calls:
+            getattr(device, method)(plmSerial, *args)
+        return []
+    commands = [queue.Submit(device, method, *args) for [device, method, args] in calls]
+    if queue.worker is None:
+        # Dispatch() returns after holdTimeout while a plmConnection is down
+        while queue.pending and (time.time() < deadline):
+            queue.Dispatch()
+    unfinished = []
+    for command in commands:
+        if not command.Wait(max(deadline - time.time(), 0)):
+            queue.Cancel(command)
+            command.device._Report(command.method + " timed out", True)
+            unfinished.append(command.device)
+    return unfinished
+
+
+def AddressText(address):
+    # returns the address as written on the device label, e.g. "00.2B.8E"
+    return ".".join("{:02X}".format(a) for a in address)
+
+
+class insteonDevice:
+    """
+    Common base of the Insteon device classes
+    Handles the address check at creation and emits events to subscribers
+    when errorStatus or one of the fields listed in watchedFields is set to
+    a different value, and when a command completes.  State() returns the
+    fields listed in stateFields as a dictionary.
+    """
+
+    watchedFields = ()
+    stateFields = ("errorStatus", "lastUpdate")
+
+    def __init__(self, address=[0, 0, 0]):
+        self.address = address
+        if len(self.address) <> 3:
+            print "ERROR: Insteon address length"
+            self.address = [0, 0, 0]
+        elif max(self.address) > 255 or min(self.address) < 0:
+            print "ERROR: Insteon address out of range"
+            self.address = [0, 0, 0]
+
+    def __setattr__(self, name, value):
+        if subscribers and (name == "errorStatus" or name in self.watchedFields):
+            old = getattr(self, name, None)
+            self.__dict__[name] = value
+            if old <> value:
+                if name == "errorStatus":
+                    EmitEvent(EVENT_ERROR, self, name, old, value)
+                else:
+                    EmitEvent(EVENT_CHANGE, self, name, old, value)
+        else:
+            self.__dict__[name] = value
+
+    def State(self):
+        # dictionary of the address, class name and the fields listed in
+        # stateFields, for reporting the device state without any PLM traffic
+        state = {"address": AddressText(self.address), "type": self.__class__.__name__}
+        for field in self.stateFields:
+            state[field] = getattr(self, field)
+        return state
+
+    def _Report(self, errorText, localError):
+        # better error checking, then let subscribers know the command is done
+        self.errorStatus = errorReporting(
+            self.address, errorText, localError, self.errorStatus, self.verbose
+        )
+        if subscribers:
+            EmitEvent(EVENT_COMPLETE, self, errorText, None, self.errorStatus)
+
+
+class dimmer(insteonDevice):
     """
     Insteon device class for dimmers
     Documentation available at
@@ -352,6 +1174,8 @@ class dimmer:
         Result of the last GetState() method
     manualOverride:
         indicates that the set and get values are not the same
+    lastUpdate:
+        host clock.time() of the last successful GetState(), 0 if never
     errorStatus:
         indicates that the readback from the PLM or dimmer did not work
     verbose:
@@ -361,8 +1185,23 @@ class dimmer:
     SetOn(level):
         turns the dimmer on to the level specified (100% if omitted)
         level is the dimmer value in percent
+
+    all of the set methods take verify=False to return once the PLM has
+    accepted the command, without waiting for the reply from the dimmer
     SetOff()
         turns the dimmer off
+    SetFastOn(level)
+        turns the dimmer on to level without the configured ramp (100% if
+        omitted)
+    SetFastOff()
+        turns the dimmer off without the configured ramp
+    SetInstant(level)
+        instant change to level, 0 turns the dimmer off
+    SetOnAtRamp(level, ramp)
+        turns the dimmer on to level (16 steps) at ramp rate 0 (slowest)
+        to 15 (fastest)
+    SetOffAtRamp(ramp)
+        turns the dimmer off at ramp rate 0 (slowest) to 15 (fastest)
     GetState()
         gets the on and level states and compares to set states to determine
         whether there has been a manual override
@@ -373,90 +1212,134 @@ class dimmer:
     lastGetOn = False
     lastGetLevel = 0
     manualOverride = False
+    lastUpdate = 0
+    watchedFields = (
+        "lastSetOn",
+        "lastSetLevel",
+        "lastGetOn",
+        "lastGetLevel",
+        "manualOverride",
+    )
+    stateFields = watchedFields + ("errorStatus", "lastUpdate")
     errorStatus = False
     verbose = False
 
-    def __init__(self, address=[0, 0, 0]):
-        self.address = address
-        if len(self.address) <> 3:
-            print "ERROR: Insteon address length"
-            self.address = [0, 0, 0]
-        elif max(self.address) > 255 or min(self.address) < 0:
-            print "ERROR: Insteon address out of range"
-            self.address = [0, 0, 0]
-
-    def SetOn(self, plmSerial, level=100):
+    def _SendLevel(self, plmSerial, cmd1, cmd2, text, isOn, level, verify=True):
+        # common body of the standard direct set commands
+        # cmd1, cmd2: Insteon command bytes
+        # text: description used in verbose and error output
+        # isOn, level: values saved in lastSetOn and lastSetLevel on success
+        # verify: False returns as soon as the PLM echo ACK arrives, leaving
+        #   the device reply to be read by the caller (see deferredVerifier)
         if self.address == [0, 0, 0]:
             print "WARNING: No action taken on null address device"
         else:
             if self.verbose:
                 print "    set address ", hex(self.address[0])[2:] + "." + hex(
                     self.address[1]
-                )[2:] + "." + hex(self.address[2])[2:] + " ON, level ", level
+                )[2:] + "." + hex(self.address[2])[2:] + " " + text
             plmSerial.flushInput()
             plmSerial.flushOutput()
 
             # build the data string to send to the PLM in the following format
-            # {0x02,0x62,da0,da1,da2,0x0F,0x11,hex_level}
-            # where da is the desination address and hex_level = [0x00..0xFF]
-            # we start with a level in percentage and convert it to this range
+            # {0x02,0x62,da0,da1,da2,0x0F,cmd1,cmd2}
+            # where da is the desination address
             tempStr = (
                 chr(0x02)
                 + chr(0x62)
                 + chr(self.address[0])
                 + chr(self.address[1])
                 + chr(self.address[2])
-                + chr(15)
-                + chr(17)
-                + chr(int(round(level * 2.55)))
+                + chr(0x0F)
+                + chr(cmd1)
+                + chr(cmd2)
             )
-            [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-
-            # better error checking
-            self.errorStatus = errorReporting(
-                self.address,
-                "Set ON, level = " + str(level),
-                localError,
-                self.errorStatus,
-                self.verbose,
+            if verify:
+                nResponse = 1
+            else:
+                nResponse = 0
+            [response, localError] = StdCmd(
+                plmSerial, tempStr, self.verbose, nResponse
             )
+
             if not localError:
-                self.lastSetOn = True
+                self.lastSetOn = isOn
                 self.lastSetLevel = level
                 self.manualOverride = False
 
-    def SetOff(self, plmSerial):
-        if self.address == [0, 0, 0]:
-            print "WARNING: No action taken on null address device"
-        else:
-            if self.verbose:
-                print "    set address ", hex(self.address[0])[2:] + "." + hex(
-                    self.address[1]
-                )[2:] + "." + hex(self.address[2])[2:] + " OFF"
-            plmSerial.flushInput()
-            plmSerial.flushOutput()
-
-            # {2,98,51,70,111,15,19,0}
-            tempStr = (
-                chr(2)
-                + chr(98)
-                + chr(self.address[0])
-                + chr(self.address[1])
-                + chr(self.address[2])
-                + chr(15)
-                + chr(19)
-                + chr(0)
-            )
-            [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-
             # better error checking
-            self.errorStatus = errorReporting(
-                self.address, "Set OFF", localError, self.errorStatus, self.verbose
-            )
-            if not localError:
-                self.lastSetOn = False
-                self.lastSetLevel = 0
-                self.manualOverride = False
+            self._Report(text, localError)
+
+    def SetOn(self, plmSerial, level=100, verify=True):
+        # hex_level = [0x00..0xFF], we start with a level in percentage
+        # and convert it to this range
+        self._SendLevel(
+            plmSerial,
+            0x11,
+            int(round(level * 2.55)),
+            "Set ON, level = " + str(level),
+            True,
+            level,
+            verify,
+        )
+
+    def SetOff(self, plmSerial, verify=True):
+        self._SendLevel(plmSerial, 0x13, 0x00, "Set OFF", False, 0, verify)
+
+    def SetFastOn(self, plmSerial, level=100, verify=True):
+        # goes straight to level ignoring the configured ramp rate
+        self._SendLevel(
+            plmSerial,
+            0x12,
+            int(round(level * 2.55)),
+            "Set FAST ON, level = " + str(level),
+            True,
+            level,
+            verify,
+        )
+
+    def SetFastOff(self, plmSerial, verify=True):
+        self._SendLevel(plmSerial, 0x14, 0x00, "Set FAST OFF", False, 0, verify)
+
+    def SetInstant(self, plmSerial, level, verify=True):
+        # instant change to level, a level of 0 turns the dimmer off
+        self._SendLevel(
+            plmSerial,
+            0x21,
+            int(round(level * 2.55)),
+            "Set INSTANT, level = " + str(level),
+            level > 0,
+            level,
+            verify,
+        )
+
+    def SetOnAtRamp(self, plmSerial, level=100, ramp=15, verify=True):
+        # cmd2 holds the on level in the high nibble and the ramp rate in
+        # the low nibble, so the level is only good to 16 steps.  The device
+        # goes to (nibble * 16 + 0x0F) which is what we save as lastSetLevel
+        # so that GetState doesn't report a manual override
+        if ramp < 0 or ramp > 15:
+            print "WARNING: ramp rate out of range:", ramp
+            return
+        levelNibble = int(round(level * 15 / 100.0))
+        setLevel = int(round(((levelNibble << 4) | 0x0F) / 2.55))
+        self._SendLevel(
+            plmSerial,
+            0x2E,
+            (levelNibble << 4) | ramp,
+            "Set ON at ramp " + str(ramp) + ", level = " + str(setLevel),
+            True,
+            setLevel,
+            verify,
+        )
+
+    def SetOffAtRamp(self, plmSerial, ramp=15, verify=True):
+        if ramp < 0 or ramp > 15:
+            print "WARNING: ramp rate out of range:", ramp
+            return
+        self._SendLevel(
+            plmSerial, 0x2F, ramp, "Set OFF at ramp " + str(ramp), False, 0, verify
+        )
 
     def GetState(self, plmSerial):
         if self.address == [0, 0, 0]:
@@ -483,17 +1366,15 @@ class dimmer:
             )
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
 
-            self.errorStatus = errorReporting(
-                self.address, "GetState", localError, self.errorStatus, self.verbose
-            )
             if not localError:
-                x = ord(response[-1:])
+                x = stdMessage(response).cmd2
                 if x == 0:
                     self.lastGetOn = False
                 else:
                     self.lastGetOn = True
 
                 self.lastGetLevel = int(round(x / 2.55))
+                self.lastUpdate = clock.time()
                 # test to see if manual override has been enacted with 2% slop
                 if (
                     self.lastGetOn <> self.lastSetOn
@@ -501,8 +1382,10 @@ class dimmer:
                 ):
                     self.manualOverride = True
 
+            self._Report("GetState", localError)
 
-class thermostat:
+
+class thermostat(insteonDevice):
     """
     Insteon device class for thermostats
     Documentation available at
@@ -531,38 +1414,77 @@ class thermostat:
         current ambient percent relative humidity (1% resolution)
     schedule:
         7x16 2D list of text values holding the current schedule (default [])
+    zones:
+        list of the zone numbers configured on the thermostat (default [0])
+    zoneState:
+        dictionary by zone of dictionaries with the actualTemp (0.5C
+        resolution), targetHeat, targetCool and actualHumi read by GetZones,
+        and the host clock.time() of the read in update
+    zoneSchedule:
+        dictionary by zone of schedule tables
+    scheduleTime:
+        dictionary by zone of 7 element lists with the host clock.time() of
+        the last good read of each day of the schedule, 0 if never
+    lastUpdate:
+        host clock.time() of the last GetState() without errors, 0 if never
     errorStatus:
         indicates that the readback from the PLM or thermostat did not work
     verbose:
         True prints a lot of debugging text to stdout while False suppresses
 
     METHODS:
-    GetState(PLM)
-        gets the on and level states and compares to set states to determine
-        whether there has been a manual override
-
-    GetSchedule(PLM)
+    GetState(PLM, fast)
+        gets the mode, setpoints, temperature and humidity.  With fast=True
+        these come from a single extended data set request (which also
+        refreshes the time values), falling back to the four separate
+        requests if that fails
+
+    GetZones(PLM, zones, schedule)
+        get the temperature, setpoints and humidity of every zone in one
+        sweep and save them in .zoneState, optionally the schedule of the
+        first zone as well
+
+    GetSchedule(PLM, deviceId, zone, retries, maxAge)
         get the current schecule from the thermostat and save in .schedule
+        Each day is kept as soon as it is read, failed days are read again
+        up to retries more times and days read less than maxAge seconds ago
+        are not read at all, so a second call resumes a partial read.
+        The days read are kept in .zoneSchedule and .scheduleTime, but
+        .schedule is only replaced once all 7 days have been read
 
     SetSchedule(PLM, schedule)
         set the current schecule to the thermostat and save in .schedule
 
+    GetTime(PLM)
+        get the thermostat day and time and save the offset from the host clock
+
+    SetTime(PLM, day, hour, minute, second, maxAge)
+        set the thermostat day and time, reusing the settings from a read less
+        than maxAge seconds old instead of reading them again
+
+    SyncTime(PLM, maxAge)
+        SetTime to the host clock at the time of sending
+
+    PredictClockError(hostTime)
+        predicted offset of the thermostat clock from the host clock in
+        seconds, from the last reading and the estimated drift
+
     UpSetPoint(PLM)
         equivalent to pushing up button on faceplate
 
     DownSetPoint(PLM)
         equivalent to pushing down button on faceplate
 
+    SetHeatSetpoint(PLM, setpoint)
+        set the heat setpoint to setpoint in degrees C rounded to 1C
+
+    SetCoolSetpoint(PLM, setpoint)
+        set the cooling setpoint to setpoint in degrees C rounded to 1C
+
     TO DO:
 
     SetMode(PLM, mode) - doesn't work as set out in the manual
         set the thermostat mode, 4 = Heat, 5 = Cool, 10 = Auto
-
-    SetHetSetpoint(PLM, setpoint) - don't need
-        set the heat setpoint to setpoint in degrees C rounded to 1C
-
-    SetCoolSetpoint(PLM, setpoint) - don't need
-        set the cooling setpoint to setpoint in degrees C rounded to 1C
     """
 
     # these values are for internal use
@@ -589,6 +1511,39 @@ class thermostat:
         + chr(0x00)
         + chr(0x00)
     )
+    # request frames built once by GetZones and GetSchedule and then reused
+    zoneFrames = None
+    scheduleFrames = None
+
+    # timeUpdate is the host clock.time() when the values above were last read
+    # or written, timeReadings holds up to 8 [host time, clock offset] pairs
+    # since the clock was last written and clockDrift is the drift in seconds
+    # per second estimated from them
+    timeUpdate = 0
+    timeReadings = []
+    clockDrift = 0.0
+
+    # readback mode values
+    # 0x00 = Off
+    # 0x01 = Heat
+    # 0x02 = Cool
+    # 0x03 = Auto
+    # 0x04 = Fan
+    # 0x05 = Program
+    # 0x06 = Program Heat
+    # 0x07 = Program Cool
+    # 0x08 = unknown - not returned from thermostat
+    modeTextArray = [
+        "Off",
+        "Heat",
+        "Cool",
+        "Auto",
+        "Fan",
+        "Program",
+        "Program Heat",
+        "Program Cool",
+        "Unknown",
+    ]
 
     # external values
     mode = 0x08
@@ -598,19 +1553,24 @@ class thermostat:
     actualTemp = 0
     actualHumi = 0
     schedule = []
+    scheduleTime = {}
+    zones = [0]
+    zoneState = {}
+    zoneSchedule = {}
+    lastUpdate = 0
     errorStatus = False
+    watchedFields = (
+        "mode",
+        "targetHeat",
+        "targetCool",
+        "actualTemp",
+        "actualHumi",
+        "schedule",
+    )
+    stateFields = watchedFields + ("modeText", "errorStatus", "lastUpdate")
     verbose = False
 
-    def __init__(self, address=[0, 0, 0]):
-        self.address = address
-        if len(self.address) <> 3:
-            print "ERROR: Insteon address length"
-            self.address = [0, 0, 0]
-        elif max(self.address) > 255 or min(self.address) < 0:
-            print "ERROR: Insteon address out of range"
-            self.address = [0, 0, 0]
-
-    def GetState(self, plmSerial):
+    def GetState(self, plmSerial, fast=False):
         if self.address == [0, 0, 0]:
             print "WARNING: No action taken on null address device"
         else:
@@ -621,7 +1581,21 @@ class thermostat:
 
             plmSerial.flushInput()
             plmSerial.flushOutput()
-            cumError = False
+
+            # the fast way is a single extended data set request, the four
+            # request sequence below is kept as the fallback if it fails,
+            # but not if the thermostat didn't answer at all
+            if fast:
+                [error, localError] = self._GetStateFast(plmSerial)
+                if not error:
+                    self.lastUpdate = clock.time()
+                if localError or not error:
+                    self._Report("GetState", error)
+                    return
+
+            # a failed request ends the sequence straight away, a mode value
+            # out of range is the only error the rest of it goes on after
+            modeError = False
             preStr = (
                 chr(0x02)
                 + chr(0x62)
@@ -635,39 +1609,22 @@ class thermostat:
             cmdStr = chr(0x6B) + chr(0x02)
             tempStr = preStr + cmdStr
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-            cumError = localError or cumError
+            if localError:
+                # a thermostat that didn't answer won't answer the rest
+                # either, so the sequence stops at the first failure
+                self._GetStateFailed(plmSerial)
+                return
             try:
-                responseMode = ord(response[-1])
+                responseMode = stdMessage(response).cmd2
             except:
                 responseMode = 9
-            if not localError and (responseMode < 8) and (responseMode >= 0):
-                # 0x00 = Off
-                # 0x01 = Heat
-                # 0x02 = Cool
-                # 0x03 = Auto
-                # 0x04 = Fan
-                # 0x05 = Program
-                # 0x06 = Program Heat
-                # 0x07 = Program Cool
-                # 0x08 = unknown - not returned from thermostat
-                modeTextArray = [
-                    "Off",
-                    "Heat",
-                    "Cool",
-                    "Auto",
-                    "Fan",
-                    "Program",
-                    "Program Heat",
-                    "Program Cool",
-                    "Unknown",
-                ]
+            if (responseMode < 8) and (responseMode >= 0):
                 self.mode = responseMode
-                self.modeText = modeTextArray[self.mode]
+                self.modeText = self.modeTextArray[self.mode]
                 if self.verbose:
                     print "mode =", self.modeText
             else:
-                # keep the error in cumError and try to move on
-                cumError = True
+                modeError = True
                 plmSerial.flushInput()
                 plmSerial.flushOutput()
 
@@ -675,33 +1632,27 @@ class thermostat:
             cmdStr = chr(0x6A) + chr(0b00100000)
             tempStr = preStr + cmdStr
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose, 2)
-            cumError = localError or cumError
-            responseHeat = response[:11]
-            responseCool = response[11:]
-            if not localError:
-                self.targetHeat = int(float(ord(responseHeat[-1])) / 2.0 + 0.5)
-                self.targetCool = int(float(ord(responseCool[-1])) / 2.0 + 0.5)
-                if self.verbose:
-                    print "heat setpoint:", self.targetHeat
-                    print "cool setpoint:", self.targetCool
-            else:
-                # keep the error in cumError and try to move on
-                plmSerial.flushInput()
-                plmSerial.flushOutput()
+            if localError:
+                self._GetStateFailed(plmSerial)
+                return
+            responseHeat = stdMessage(response)
+            responseCool = stdMessage(response, 11)
+            self.targetHeat = int(float(responseHeat.cmd2) / 2.0 + 0.5)
+            self.targetCool = int(float(responseCool.cmd2) / 2.0 + 0.5)
+            if self.verbose:
+                print "heat setpoint:", self.targetHeat
+                print "cool setpoint:", self.targetCool
 
             # get zone information, zone 0 humidity
             cmdStr = chr(0x6A) + chr(0b01100000)
             tempStr = preStr + cmdStr
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-            cumError = localError or cumError
-            if not localError:
-                self.actualHumi = float(ord(response[-1]))
-                if self.verbose:
-                    print "zone 0 humidity:", str(self.actualHumi) + "%"
-            else:
-                # keep the error in cumError and try to move on
-                plmSerial.flushInput()
-                plmSerial.flushOutput()
+            if localError:
+                self._GetStateFailed(plmSerial)
+                return
+            self.actualHumi = float(stdMessage(response).cmd2)
+            if self.verbose:
+                print "zone 0 humidity:", str(self.actualHumi) + "%"
 
             # get dataset 1 extended CS command
             preExt = preStr[:-1] + chr(0x1F)
@@ -724,20 +1675,179 @@ class thermostat:
             )
             tempStr = preExt + extCmdData
             [response, localError] = ExtChecksum(plmSerial, tempStr, self.verbose)
-            cumError = localError or cumError
+            if localError:
+                self._GetStateFailed(plmSerial)
+                return
+            extResponse = extMessage(response)
+            self.actualTemp = (extResponse.Data(3) * 256 + extResponse.Data(4)) / 10.0
+            if self.verbose:
+                print "ambient temperature:", self.actualTemp
+
+            # end of work, now set the overall error state
+            if not modeError:
+                self.lastUpdate = clock.time()
+            self._Report("GetState", modeError)
+
+    def _GetStateFailed(self, plmSerial):
+        plmSerial.flushInput()
+        plmSerial.flushOutput()
+        self._Report("GetState", True)
+
+    def _GetStateFast(self, plmSerial):
+        # fills mode, setpoints, temperature, humidity and the time values
+        # from the extended get data set 1 response (0x2E 0x02), which is
+        # the same request as GetTime.  Returns [error, transport error]:
+        # GetState falls back to the individual requests on an error in the
+        # response, but not when the request itself failed.
+        #
+        # response data set 1:
+        #   D1:  0x01 data set 1
+        #   D2:  day, D3: hour, D4: minute, D5: second
+        #   D6:  high nibble system mode, low nibble fan mode
+        #        system mode 0 = Off, 1 = Auto, 2 = Heat, 3 = Cool, 4 = Program
+        #        fan mode 0 = Auto, 1 = On
+        #   D7:  cool setpoint
+        #   D8:  humidity
+        #   D9:  temperature high byte (0.1C)
+        #   D10: temperature low byte
+        #   D11: status flags, bit 3 set for setpoints in Celsius
+        #   D12: heat setpoint
+        tempStr = (
+            chr(0x02)
+            + chr(0x62)
+            + chr(self.address[0])
+            + chr(self.address[1])
+            + chr(self.address[2])
+            + chr(0x1F)
+            + chr(0x2E)
+            + chr(0x02)
+            + chr(0x00) * 12
+        )
+        [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
+        if localError or len(response) <> 25:
+            plmSerial.flushInput()
+            plmSerial.flushOutput()
+            return [True, localError]
+        extResponse = extMessage(response)
+        if (extResponse.cmd2 <> 0x02) or (extResponse.Data(1) <> 0x01):
+            return [True, False]
+        systemMode = extResponse.Data(6) >> 4
+        fanMode = extResponse.Data(6) & 0x0F
+        if systemMode > 4:
+            return [True, False]
+        # convert to the readback values of the 0x6B 0x02 query
+        if systemMode == 0 and fanMode == 1:
+            self.mode = 4
+        else:
+            self.mode = [0, 3, 1, 2, 5][systemMode]
+        self.modeText = self.modeTextArray[self.mode]
+        coolSetpoint = extResponse.Data(7)
+        heatSetpoint = extResponse.Data(12)
+        if not (extResponse.Data(11) & 0x08):
+            coolSetpoint = (coolSetpoint - 32) / 1.8
+            heatSetpoint = (heatSetpoint - 32) / 1.8
+        self.targetCool = int(coolSetpoint + 0.5)
+        self.targetHeat = int(heatSetpoint + 0.5)
+        self.actualHumi = float(extResponse.Data(8))
+        self.actualTemp = (extResponse.Data(9) * 256 + extResponse.Data(10)) / 10.0
+        self.getTimeResponse = extResponse.userData[:12].tobytes()
+        self.day = extResponse.Data(2)
+        self.hour = extResponse.Data(3)
+        self.minute = extResponse.Data(4)
+        self.second = extResponse.Data(5)
+        self._RecordTime(clock.time())
+        if self.verbose:
+            print "mode =", self.modeText
+            print "heat setpoint:", self.targetHeat
+            print "cool setpoint:", self.targetCool
+            print "humidity:", str(self.actualHumi) + "%"
+            print "ambient temperature:", self.actualTemp
+        return [False, False]
+
+    def GetZones(self, plmSerial, zones=None, schedule=False):
+        # reads temperature, setpoints and humidity of every zone in zones
+        # (self.zones if omitted) in one sweep and saves them in zoneState.
+        # Zone 0 also updates targetHeat, targetCool and actualHumi.
+        #
+        # zone information request, cmd1 0x6A, cmd2:
+        #   bits 0-4: zone number
+        #   bits 5-6: 00 = temperature, 01 = setpoint, 11 = humidity
+        # the setpoint request gets two responses, heat then cool
+        #
+        # schedule=True also reads the schedule.  The schedule request has
+        # no zone field, so it is read once and saved in zoneSchedule for
+        # the first zone only, the other zones get no schedule
+        if self.address == [0, 0, 0]:
+            print "WARNING: No action taken on null address device"
+            return
+        if zones is None:
+            zones = self.zones
+        if self.verbose:
+            print "    get address ", hex(self.address[0])[2:] + "." + hex(
+                self.address[1]
+            )[2:] + "." + hex(self.address[2])[2:] + " GetZones", zones
+
+        plmSerial.flushInput()
+        plmSerial.flushOutput()
+        if self.zoneFrames is None:
+            self.zoneFrames = {}
+        cumError = False
+        zoneState = dict(self.zoneState)
+        for zone in zones:
+            if zone not in self.zoneFrames:
+                # the frames for a zone are built once and reused
+                preStr = (
+                    chr(0x02)
+                    + chr(0x62)
+                    + chr(self.address[0])
+                    + chr(self.address[1])
+                    + chr(self.address[2])
+                    + chr(0x0F)
+                    + chr(0x6A)
+                )
+                self.zoneFrames[zone] = [
+                    preStr + chr(0b00000000 | zone),
+                    preStr + chr(0b00100000 | zone),
+                    preStr + chr(0b01100000 | zone),
+                ]
+            [tempFrame, setpointFrame, humidityFrame] = self.zoneFrames[zone]
+            state = {}
+            [response, localError] = StdCmd(plmSerial, tempFrame, self.verbose)
             if not localError:
-                self.actualTemp = (ord(response[13]) * 256 + ord(response[14])) / 10.0
-                if self.verbose:
-                    print "ambient temperature:", self.actualTemp
-            else:
+                state["actualTemp"] = stdMessage(response).cmd2 / 2.0
+            [response, setpointError] = StdCmd(
+                plmSerial, setpointFrame, self.verbose, 2
+            )
+            if not setpointError:
+                state["targetHeat"] = int(float(stdMessage(response).cmd2) / 2.0 + 0.5)
+                state["targetCool"] = int(
+                    float(stdMessage(response, 11).cmd2) / 2.0 + 0.5
+                )
+            localError = localError or setpointError
+            [response, humidityError] = StdCmd(plmSerial, humidityFrame, self.verbose)
+            if not humidityError:
+                state["actualHumi"] = float(stdMessage(response).cmd2)
+            localError = localError or humidityError
+            if localError:
                 # keep the error in cumError and try to move on
                 plmSerial.flushInput()
                 plmSerial.flushOutput()
+            else:
+                state["update"] = clock.time()
+                zoneState[zone] = state
+                if zone == 0:
+                    self.targetHeat = state["targetHeat"]
+                    self.targetCool = state["targetCool"]
+                    self.actualHumi = state["actualHumi"]
+            cumError = localError or cumError
+            if self.verbose:
+                print "zone", zone, state
+        self.zoneState = zoneState
 
-            # end of work, now set the overall error state
-            self.errorStatus = errorReporting(
-                self.address, "GetState", cumError, self.errorStatus, self.verbose
-            )
+        if schedule and zones:
+            self.GetSchedule(plmSerial, zone=zones[0])
+            cumError = cumError or self.errorStatus
+        self._Report("GetZones", cumError)
 
     def UpSetPoint(self, plmSerial):
         if self.address == [0, 0, 0]:
@@ -762,12 +1872,10 @@ class thermostat:
                 + chr(0)
             )
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-            time.sleep(1.5)
+            clock.sleep(1.5)
 
             # better error checking
-            self.errorStatus = errorReporting(
-                self.address, "UpSetPoint", localError, self.errorStatus, self.verbose
-            )
+            self._Report("UpSetPoint", localError)
 
     def DownSetPoint(self, plmSerial):
         if self.address == [0, 0, 0]:
@@ -792,14 +1900,111 @@ class thermostat:
                 + chr(0)
             )
             [response, localError] = StdCmd(plmSerial, tempStr, self.verbose)
-            time.sleep(1.5)
+            clock.sleep(1.5)
 
             # better error checking
-            self.errorStatus = errorReporting(
-                self.address, "DownSetPoint", localError, self.errorStatus, self.verbose
+            self._Report("DownSetPoint", localError)
+
+    def _SendSetpoint(self, plmSerial, cmd1, setpoint, field, text):
+        # one extended command sets the setpoint directly, cmd2 is the
+        # setpoint in half degrees, the same units as the zone readback
+        setpoint = int(round(setpoint))
+        if self.address == [0, 0, 0]:
+            print "WARNING: No action taken on null address device"
+        elif setpoint < 0 or setpoint > 127:
+            print "WARNING: setpoint for thermostat out of range:", setpoint
+        else:
+            if self.verbose:
+                print "    set address ", hex(self.address[0])[2:] + "." + hex(
+                    self.address[1]
+                )[2:] + "." + hex(self.address[2])[2:] + " " + text
+            plmSerial.flushInput()
+            plmSerial.flushOutput()
+
+            tempStr = (
+                chr(0x02)
+                + chr(0x62)
+                + chr(self.address[0])
+                + chr(self.address[1])
+                + chr(self.address[2])
+                + chr(0x1F)
+                + chr(cmd1)
+                + chr(setpoint * 2)
+                + chr(0x00) * 13
             )
+            # ExtChecksum returns once the thermostat has ACKed the command
+            # (0x50), so there is nothing more to wait for
+            [response, localError] = ExtChecksum(
+                plmSerial, tempStr, self.verbose, extreadback=False
+            )
+            if not localError:
+                setattr(self, field, setpoint)
 
-    def GetSchedule(self, plmSerial, deviceId=8, zone=0):
+            # better error checking
+            self._Report(text, localError)
+
+    def SetHeatSetpoint(self, plmSerial, setpoint):
+        self._SendSetpoint(plmSerial, 0x6D, setpoint, "targetHeat", "SetHeatSetpoint")
+
+    def SetCoolSetpoint(self, plmSerial, setpoint):
+        self._SendSetpoint(plmSerial, 0x6C, setpoint, "targetCool", "SetCoolSetpoint")
+
+    def _GetScheduleDay(self, plmSerial, iDay, deviceId, zone, scheduleMode):
+        # reads one day of the schedule, returns the table row or None
+        cmd2 = chr(0x0A + iDay * 2)
+        tempStr = self.scheduleFrames[iDay]
+        [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
+        if localError:
+            return None
+        extResponse = extMessage(response)
+        cmdCheck = extResponse.cmd2 == ord(cmd2) + 1
+        timeCheck = (
+            (extResponse.Data(1) < 96)
+            and (extResponse.Data(4) < 96)
+            and (extResponse.Data(7) < 96)
+            and (extResponse.Data(10) < 96)
+        )
+        if not (cmdCheck and timeCheck):
+            return None
+        ##+--------------+---------+
+        ##| Field        | Type    |
+        ##+--------------+---------+
+        ##| scheduleid   | int(11) |
+        ##| deviceid     | int(11) |
+        ##| zone         | int(11) |
+        ##| schedulemode | int(11) |
+        ##| day          | int(11) |
+        ##| waketime     | time    |
+        ##| wakecool     | int(11) |
+        ##| wakeheat     | int(11) |
+        ##| leavetime    | time    |
+        ##| leavecool    | int(11) |
+        ##| leaveheat    | int(11) |
+        ##| returntime   | time    |
+        ##| returncool   | int(11) |
+        ##| returnheat   | int(11) |
+        ##| sleeptime    | time    |
+        ##| sleepcool    | int(11) |
+        ##| sleepheat    | int(11) |
+        ##+--------------+---------+
+        tfmt = "{0:d}:{1:0>2d}:00"
+        scheduleId = iDay + 1 + (scheduleMode - 1) * 7 + 49 * zone
+        schedLine = []
+        schedLine.append(str(scheduleId))
+        schedLine.append(str(deviceId))
+        schedLine.append(str(zone))
+        schedLine.append(str(scheduleMode))
+        schedLine.append(str(iDay))
+        for iPeriod in range(4):
+            t = extResponse.Data(1 + iPeriod * 3) / 4.0
+            h = int(t)
+            m = int((t - h) * 60)
+            schedLine.append(tfmt.format(h, m))
+            schedLine.append(str(extResponse.Data(2 + iPeriod * 3)))
+            schedLine.append(str(extResponse.Data(3 + iPeriod * 3)))
+        return schedLine
+
+    def GetSchedule(self, plmSerial, deviceId=8, zone=0, retries=3, maxAge=None):
         if self.address == [0, 0, 0]:
             print "WARNING: No action taken on null address device"
         else:
@@ -811,7 +2016,6 @@ class thermostat:
             plmSerial.flushInput()
             plmSerial.flushOutput()
             scheduleMode = 7
-            cumError = False
 
             prefixStr = (
                 chr(0x02)
@@ -836,72 +2040,67 @@ class thermostat:
                 + chr(0x00)
             )
             cmd1 = chr(0x2E)
-            schedTable = []
-            tfmt = "{0:d}:{1:0>2d}:00"
+            if self.scheduleFrames is None:
+                self.scheduleFrames = [
+                    prefixStr + cmd1 + chr(0x0A + iDay * 2) + data1Thru12
+                    for iDay in range(7)
+                ]
 
-            for iDay in range(7):
-                cmd2 = chr(0x0A + iDay * 2)
-                tempStr = prefixStr + cmd1 + cmd2 + data1Thru12
-                [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
-                cumError = localError or cumError
-                if not localError:
-                    cmdCheck = ord(response[10]) == ord(cmd2) + 1
-                    timeCheck = (
-                        (ord(response[11]) < 96)
-                        and (ord(response[14]) < 96)
-                        and (ord(response[17]) < 96)
-                        and (ord(response[20]) < 96)
-                    )
-                else:
-                    cmdCheck = False
-                    timeCheck = False
-                if (not cumError) and cmdCheck and timeCheck:
-                    ##+--------------+---------+
-                    ##| Field        | Type    |
-                    ##+--------------+---------+
-                    ##| scheduleid   | int(11) |
-                    ##| deviceid     | int(11) |
-                    ##| zone         | int(11) |
-                    ##| schedulemode | int(11) |
-                    ##| day          | int(11) |
-                    ##| waketime     | time    |
-                    ##| wakecool     | int(11) |
-                    ##| wakeheat     | int(11) |
-                    ##| leavetime    | time    |
-                    ##| leavecool    | int(11) |
-                    ##| leaveheat    | int(11) |
-                    ##| returntime   | time    |
-                    ##| returncool   | int(11) |
-                    ##| returnheat   | int(11) |
-                    ##| sleeptime    | time    |
-                    ##| sleepcool    | int(11) |
-                    ##| sleepheat    | int(11) |
-                    ##+--------------+---------+
-                    scheduleId = iDay + 1 + (scheduleMode - 1) * 7 + 49 * zone
-                    schedLine = []
-                    schedLine.append(str(scheduleId))
-                    schedLine.append(str(deviceId))
-                    schedLine.append(str(zone))
-                    schedLine.append(str(scheduleMode))
-                    schedLine.append(str(iDay))
-                    for iPeriod in range(4):
-                        t = ord(response[11 + iPeriod * 3]) / 4.0
-                        h = int(t)
-                        m = int((t - h) * 60)
-                        schedLine.append(tfmt.format(h, m))
-                        schedLine.append(str(ord(response[12 + iPeriod * 3])))
-                        schedLine.append(str(ord(response[13 + iPeriod * 3])))
-
-                    schedTable.append(schedLine)
+            # start from the days already held for this zone, so a day that
+            # fails keeps its last good row and only the failed days are read
+            # again.  Days read less than maxAge seconds ago are not read.
+            days = {}
+            for row in self.zoneSchedule.get(zone, []):
+                days[int(row[4])] = row
+            dayTime = list(self.scheduleTime.get(zone, [0] * 7))
+            now = clock.time()
+            pending = [
+                iDay
+                for iDay in range(7)
+                if (maxAge is None)
+                or (iDay not in days)
+                or (now - dayTime[iDay] > maxAge)
+            ]
+            failed = []
+            for iDay in pending:
+                schedLine = self._GetScheduleDay(
+                    plmSerial, iDay, deviceId, zone, scheduleMode
+                )
+                if schedLine is None:
+                    failed.append(iDay)
                 else:
-                    cumError = True
+                    days[iDay] = schedLine
+                    dayTime[iDay] = clock.time()
 
-            # end of work, now save the table and set the overall error state
-            self.errorStatus = errorReporting(
-                self.address, "GetSchedule", cumError, self.errorStatus, self.verbose
-            )
-            if not cumError:
+            # retry the failed days, at most retries reads in all
+            while failed and retries > 0:
+                plmSerial.flushInput()
+                plmSerial.flushOutput()
+                iDay = failed.pop(0)
+                retries -= 1
+                schedLine = self._GetScheduleDay(
+                    plmSerial, iDay, deviceId, zone, scheduleMode
+                )
+                if schedLine is None:
+                    failed.append(iDay)
+                else:
+                    days[iDay] = schedLine
+                    dayTime[iDay] = clock.time()
+            if failed and self.verbose:
+                print "    schedule days not read:", sorted(failed)
+
+            # end of work, now save the table and set the overall error state.
+            # A partial table is only kept by zone, schedule stays 7x16.
+            schedTable = [days[iDay] for iDay in sorted(days)]
+            if len(schedTable) == 7:
                 self.schedule = schedTable
+            zoneSchedule = dict(self.zoneSchedule)
+            zoneSchedule[zone] = schedTable
+            self.zoneSchedule = zoneSchedule
+            scheduleTime = dict(self.scheduleTime)
+            scheduleTime[zone] = dayTime
+            self.scheduleTime = scheduleTime
+            self._Report("GetSchedule", bool(failed) or len(schedTable) <> 7)
 
     def SetSchedule(self, plmSerial, schedTable):
         if self.address == [0, 0, 0]:
@@ -946,14 +2145,12 @@ class thermostat:
                 tempStr = prefixStr + cmd1 + cmd2 + data1Thru12
                 [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose, False)
                 cumError = localError or cumError
-                time.sleep(4)
+                clock.sleep(4)
 
             # end of work, now save the table and set the overall error state
-            self.errorStatus = errorReporting(
-                self.address, "SetSchedule", cumError, self.errorStatus, self.verbose
-            )
             if not cumError:
                 self.schedule = schedTable
+            self._Report("SetSchedule", cumError)
 
     def SetMode(self, plmSerial, mode):
         if self.address == [0, 0, 0]:
@@ -1017,12 +2214,10 @@ class thermostat:
             [response, localError] = ExtChecksum(
                 plmSerial, tempStr, self.verbose, extreadback=False
             )
-            time.sleep(1.5)
+            clock.sleep(1.5)
 
             # better error checking
-            self.errorStatus = errorReporting(
-                self.address, "SetMode", localError, self.errorStatus, self.verbose
-            )
+            self._Report("SetMode", localError)
 
     def GetTime(self, plmSerial):
         if self.address == [0, 0, 0]:
@@ -1064,22 +2259,24 @@ class thermostat:
             tempStr = prefixStr + cmd1 + cmd2 + data1Thru12
             [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
             cumError = localError or cumError
+            extResponse = extMessage(response)
             if not localError:
                 cmdCheck = (
-                    (ord(response[10]) == ord(cmd2))
-                    and (ord(response[11]) == ord(data1Thru12[0]) + 1)
-                    and len(response) == 25
+                    (extResponse.cmd2 == ord(cmd2))
+                    and (extResponse.Data(1) == ord(data1Thru12[0]) + 1)
+                    and extResponse.valid
                 )
             else:
                 cmdCheck = False
             if (not cumError) and cmdCheck:
                 # normal work
-                data1Thru12 = response[11:23]
+                data1Thru12 = extResponse.userData[:12].tobytes()
                 self.getTimeResponse = data1Thru12
                 self.day = ord(data1Thru12[1])
                 self.hour = ord(data1Thru12[2])
                 self.minute = ord(data1Thru12[3])
                 self.second = ord(data1Thru12[4])
+                self._RecordTime(clock.time())
             else:
                 self.getTimeResponse = (
                     chr(0xFF)
@@ -1096,11 +2293,46 @@ class thermostat:
                     + chr(0x00)
                 )
 
-            self.errorStatus = errorReporting(
-                self.address, "GetTime", cumError, self.errorStatus, self.verbose
-            )
-
-    def SetTime(self, plmSerial, day, hour, minute, second):
+            self._Report("GetTime", cumError)
+
+    def _RecordTime(self, hostTime):
+        # saves the offset of the thermostat clock from the host clock when
+        # day/hour/minute/second were read or written, and updates the drift
+        # estimate from the readings since the last write
+        self.timeUpdate = hostTime
+        offset = ClockOffset(self.day, self.hour, self.minute, self.second, hostTime)
+        self.timeReadings = self.timeReadings[-7:] + [[hostTime, offset]]
+        if len(self.timeReadings) >= 2:
+            t0 = self.timeReadings[0][0]
+            span = hostTime - t0
+            if span >= 600:
+                # least squares slope of offset against time
+                n = len(self.timeReadings)
+                mt = sum(r[0] - t0 for r in self.timeReadings) / float(n)
+                mo = sum(r[1] for r in self.timeReadings) / float(n)
+                num = sum((r[0] - t0 - mt) * (r[1] - mo) for r in self.timeReadings)
+                den = sum((r[0] - t0 - mt) ** 2 for r in self.timeReadings)
+                if den > 0:
+                    self.clockDrift = num / den
+
+    def PredictClockError(self, hostTime=None):
+        # predicted offset in seconds of the thermostat clock from the host
+        # clock at hostTime (now if omitted), None if it was never read
+        if hostTime is None:
+            hostTime = clock.time()
+        if not self.timeReadings:
+            return None
+        [t, offset] = self.timeReadings[-1]
+        return offset + self.clockDrift * (hostTime - t)
+
+    def SyncTime(self, plmSerial, maxAge=None):
+        # sets the thermostat clock to the host clock at the time of sending
+        now = clock.now()
+        self.SetTime(
+            plmSerial, now.isoweekday() % 7, now.hour, now.minute, now.second, maxAge
+        )
+
+    def SetTime(self, plmSerial, day, hour, minute, second, maxAge=None):
         if self.address == [0, 0, 0]:
             print "WARNING: No action taken on null address device"
         else:
@@ -1138,23 +2370,35 @@ class thermostat:
             cmd1 = chr(0x2E)
             cmd2 = chr(0x02)
             tempStr = prefixStr + cmd1 + cmd2 + data1Thru12
-            [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
-            time.sleep(1.5)
-            cumError = localError or cumError
-            if not localError:
-                cmdCheck = (
-                    (ord(response[10]) == ord(cmd2))
-                    and (ord(response[11]) == ord(data1Thru12[0]) + 1)
-                    and len(response) == 25
-                )
+            if (
+                (maxAge is not None)
+                and (ord(self.getTimeResponse[0]) <> 0xFF)
+                and (clock.time() - self.timeUpdate <= maxAge)
+            ):
+                # a recent read already holds the other settings, no need
+                # to ask the thermostat for them again
+                settings = self.getTimeResponse[5:12]
+                localError = False
             else:
-                cmdCheck = True
+                [response, localError] = ExtCrc(plmSerial, tempStr, self.verbose)
+                clock.sleep(1.5)
+                cumError = localError or cumError
+                extResponse = extMessage(response)
+                if not localError:
+                    cmdCheck = (
+                        (extResponse.cmd2 == ord(cmd2))
+                        and (extResponse.Data(1) == ord(data1Thru12[0]) + 1)
+                        and extResponse.valid
+                    )
+                else:
+                    cmdCheck = True
 
-            cumError = (not cmdCheck) or cumError
+                cumError = (not cmdCheck) or cumError
+                if not cumError:
+                    settings = extResponse.userData[5:12].tobytes()
 
             if not cumError:
-                # set the values to the previous response
-                data1Thru12 = response[11:23]
+                # set the values to the previous response and
                 # replace the day and time data
                 data1Thru12 = (
                     chr(0x02)
@@ -1162,14 +2406,14 @@ class thermostat:
                     + chr(hour)
                     + chr(minute)
                     + chr(second)
-                    + response[16:23]
+                    + settings
                 )
                 # write these values to the thermostat
                 tempStr = prefixStr + cmd1 + cmd2 + data1Thru12
                 [response, localError] = ExtCrc(
                     plmSerial, tempStr, self.verbose, extreadback=False
                 )
-                time.sleep(1.5)
+                clock.sleep(1.5)
             cumError = localError or cumError
 
             if not cumError:
@@ -1178,6 +2422,9 @@ class thermostat:
                 self.minute = ord(data1Thru12[3])
                 self.second = ord(data1Thru12[4])
                 self.getTimeResponse = data1Thru12
+                # the clock was just written, so the offset starts again at 0
+                self.timeReadings = []
+                self._RecordTime(clock.time())
             else:
                 self.getTimeResponse = (
                     chr(0xFF)
@@ -1194,101 +2441,13 @@ class thermostat:
                     + chr(0x00)
                 )
 
-            self.errorStatus = errorReporting(
-                self.address, "SetTime", cumError, self.errorStatus, self.verbose
-            )
+            self._Report("SetTime", cumError)
 
 
 if __name__ == "__main__":
-    import serial
+    # the command line tool for a whole site is in insteonFleet, e.g.
+    #   python insteonFleet.py --config insteon.json poll
+    import sys
+    from insteonFleet import Main
 
-    machine = "unix"
-    # machine = "windows"
-    # PLM serial port connection settings and open
-    #
-    if machine == "unix":
-        SERIALPORT = "/dev/ttyUSB0"  # put your device path here
-    elif machine == "windows":
-        SERIALPORT = "COM3"  # windows version
-    BAUDRATE = 19200  # standard for Insteon PLMs
-    insteonPlm = serial.Serial(SERIALPORT, BAUDRATE)
-    insteonPlm.bytesize = serial.EIGHTBITS  # number of bits per bytes
-    insteonPlm.parity = serial.PARITY_NONE  # set parity check: no parity
-    insteonPlm.stopbits = serial.STOPBITS_ONE  # number of stop bits
-    insteonPlm.timeout = 2  # timeout block read
-    insteonPlm.xonxoff = False  # disable software flow control
-    insteonPlm.rtscts = False  # disable hardware (RTS/CTS) flow control
-    insteonPlm.dsrdtr = False  # disable hardware (DSR/DTR) flow control
-    insteonPlm.writeTimeout = 0  # timeout for write
-
-    if machine == "windows":
-        pass
-    else:
-        attempts = 0
-        maxattempts = 10
-        attemptwait = 30
-        success = False
-        while (not success) and (attempts < maxattempts):
-            try:
-                insteonPlm.open()
-                success = True
-            except Exception, e:
-                print "ERROR: opening serial port PLM connection: " + str(e)
-                attempts += 1
-                success = False
-                time.sleep(attemptwait)
-
-        if not success:
-            print "FATAL: couldn't open serial port connection to PLM"
-            exit()
-
-    dimmerAddresses = []
-    dimmerAddresses.append(
-        [0xFF, 0xFF, 0xFF]
-    )  # change to your actual device address and append as many as you have dimmers
-    dimmers = []
-    for address in dimmerAddresses:
-        dimmers.append(dimmer(address))
-    print len(dimmers), "dimmers setup"
-    for iDimmer, dimmer in enumerate(dimmers):
-        dimmer.GetState(insteonPlm)
-        print "dimmer", iDimmer, "set to", dimmer.lastGetLevel
-
-    thermostatAddresses = []
-    thermostatAddresses.append(
-        [0xFF, 0xFF, 0xFF]
-    )  # change to your actual device address and append as many as you have thermostats
-    thermostats = []
-    for address in thermostatAddresses:
-        thermostats.append(thermostat(address))
-    print len(thermostats), "thermostats setup"
-    for iThermostat, thermostat in enumerate(thermostats):
-        thermostat.GetState(insteonPlm)
-        print "thermostat", iThermostat, "temperature is", thermostat.actualTemp
-        thermostat.GetTime(insteonPlm)
-        print "\nthermostat current time:"
-        print "------------------------"
-        print " thermostat", iThermostat, "day is   ", thermostat.day
-        print " thermostat", iThermostat, "hour is  ", thermostat.hour
-        print " thermostat", iThermostat, "minute is", thermostat.minute
-        print " thermostat", iThermostat, "second is", thermostat.second
-        now = datetime.datetime.now()
-        day = now.isoweekday() % 7
-        hour = now.hour
-        minute = now.minute
-        second = now.second
-        print "\nsystem current time:"
-        print "------------------------"
-        print " system day is   ", day
-        print " system hour is  ", hour
-        print " system minute is", minute
-        print " system second is", second
-        print "\n*** updating thermostat time***"
-        thermostat.SetTime(insteonPlm, day, hour, minute, second)
-        thermostat.GetTime(insteonPlm)
-        print "\nthermostat updated time:"
-        print "------------------------"
-        print " thermostat", iThermostat, "day is   ", thermostat.day
-        print " thermostat", iThermostat, "hour is  ", thermostat.hour
-        print " thermostat", iThermostat, "minute is", thermostat.minute
-        print " thermostat", iThermostat, "second is", thermostat.second
+    sys.exit(Main())
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+"""
+ Insteon Fleet Command Line Tool
+ runs operations across every device of a site from one invocation, e.g.
+ from cron.  The devices are read from a JSON config file, each PLM gets
+ its own command queue (insteonQueue) and up to --jobs PLMs are worked at
+ the same time.  Results are printed to stdout as JSON.
+
+ Usage:
+    insteonFleet.py [-c CONFIG] [-j JOBS] COMMAND [options]
+
+    poll [--fast] [DEVICE ...]          GetState, prints the device state
+    set DEVICE [--on | --off | --level PERCENT | --mode MODE |
+        --heat C | --cool C]            sets a dimmer or thermostat
+    schedule get [DEVICE ...]           prints the thermostat schedules
+    schedule set DEVICE FILE            sets a schedule from a JSON file
+                                        holding a 7 row schedule table
+    time-sync [--threshold SECONDS]     sets the thermostat clocks that
+                                        have drifted, those not done
+                                        within --timeout are reported
+                                        with timedOut
+    discover [ADDRESS ...]              identifies devices (insteonProbe),
+                                        the configured addresses by default
+
+    DEVICE is a configured device name or address, e.g. 00.2B.8E, and no
+    DEVICE means every configured device of the right type.
+
+ Config file:
+    {
+        "plms": [
+            {
+                "port": "/dev/ttyUSB0",
+                "baudrate": 19200,
+                "timeout": 2,
+                "devices": [
+                    {"address": "00.2B.8E", "type": "dimmer", "name": "hall"},
+                    {"address": "00.4C.1D", "type": "thermostat"}
+                ]
+            }
+        ],
+        "probeCache": "probe.json"
+    }
+
+ Functions:
+    LoadConfig: reads the config file and creates the PLMs and devices
+    Main: command line entry point
+
+ History:
+    October 2026 - first version
+ """
+
+import argparse, json, sys, threading, time
+from insteonDeviceClasses import (
+    dimmer,
+    thermostat,
+    AddressText,
+    EnableBreakers,
+    SyncThermostatClocks,
+)
+from insteonPlm import plmConnection
+from insteonQueue import commandQueue
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+deviceTypes = {"dimmer": dimmer, "thermostat": thermostat}
+
+
+def ParseAddress(text):
+    # "00.2B.8E" (or 00:2B:8E, 002B8E) to [0x00, 0x2B, 0x8E]
+    digits = text.replace(".", "").replace(":", "")
+    if len(digits) <> 6:
+        raise ValueError("bad Insteon address: " + text)
+    return [int(digits[i : i + 2], 16) for i in (0, 2, 4)]
+
+
+class fleetPlm:
+    # one PLM of the config with its devices and command queue.  The
+    # connection is only opened when the PLM is first used.
+    def __init__(self, config):
+        self.port = config["port"]
+        self.connection = plmConnection(
+            self.port, config.get("baudrate", 19200), config.get("timeout", 2)
+        )
+        self.queue = commandQueue(self.connection)
+        self.devices = []
+        self.names = {}
+        for entry in config.get("devices", []):
+            device = deviceTypes[entry["type"]](ParseAddress(entry["address"]))
+            self.devices.append(device)
+            self.names[id(device)] = entry.get("name", entry["address"])
+
+    def Open(self, attempts):
+        if self.connection.healthy:
+            return True
+        return self.connection.Open(attempts, 5)
+
+    def Close(self):
+        self.connection.Close()
+
+
+def LoadConfig(fileName):
+    # returns [config, list of fleetPlm]
+    configFile = open(fileName, "r")
+    try:
+        config = json.load(configFile)
+    finally:
+        configFile.close()
+    return [config, [fleetPlm(entry) for entry in config.get("plms", [])]]
+
+
+def _Select(plms, names, deviceClass=None):
+    # [plm, device] pairs for the names or addresses given, all devices of
+    # deviceClass if none are given
+    selected = []
+    wanted = [name.upper() for name in names]
+    found = set()
+    for plm in plms:
+        for device in plm.devices:
+            keys = [AddressText(device.address), plm.names[id(device)].upper()]
+            if wanted:
+                match = [key for key in keys if key in wanted]
+                if not match:
+                    continue
+                found.update(match)
+            elif (deviceClass is not None) and not isinstance(device, deviceClass):
+                continue
+            selected.append([plm, device])
+    missing = [name for name in wanted if name not in found]
+    if missing:
+        raise ValueError("unknown device: " + ", ".join(missing))
+    return selected
+
+
+def _Result(plm, device, method, command=None, **extra):
+    result = {
+        "name": plm.names.get(id(device), AddressText(device.address)),
+        "command": method,
+        "error": device.errorStatus,
+        "state": device.State(),
+    }
+    if command is not None:
+        result["error"] = command.error or not command.done.isSet()
+        result["skipped"] = command.skipped
+    result.update(extra)
+    return result
+
+
+def _RunFleet(calls, jobs, attempts, timeout):
+    # calls: list of [plm, device, method, args, kwargs].  The commands are
+    # submitted to the queue of their PLM and the PLMs are worked jobs at a
+    # time, one thread each.  Returns the list of results.
+    byPlm = []
+    for [plm, device, method, args, kwargs] in calls:
+        command = plm.queue.Submit(device, method, *args, **kwargs)
+        if not byPlm or byPlm[-1][0] is not plm:
+            byPlm.append([plm, []])
+        byPlm[-1][1].append([device, method, command])
+    limit = threading.Semaphore(jobs)
+    deadline = time.time() + timeout
+
+    def Work(plm):
+        limit.acquire()
+        try:
+            if not plm.Open(attempts):
+                return
+            while plm.queue.pending and (time.time() < deadline):
+                plm.queue.Dispatch()
+        finally:
+            limit.release()
+
+    threads = []
+    for [plm, commands] in byPlm:
+        thread = threading.Thread(target=Work, args=(plm,))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0) + 1)
+    results = []
+    for [plm, commands] in byPlm:
+        for [device, method, command] in commands:
+            results.append(_Result(plm, device, method, command))
+    return results
+
+
+def _Poll(args, plms):
+    calls = []
+    for [plm, device] in _Select(plms, args.devices):
+        if isinstance(device, thermostat):
+            calls.append([plm, device, "GetState", (), {"fast": args.fast}])
+        else:
+            calls.append([plm, device, "GetState", (), {}])
+    return _RunFleet(calls, args.jobs, args.attempts, args.timeout)
+
+
+def _Set(args, plms):
+    [[plm, device]] = _Select(plms, [args.device])
+    calls = []
+    if isinstance(device, dimmer):
+        if args.off:
+            calls.append([plm, device, "SetOff", (), {}])
+        elif args.level is not None:
+            calls.append([plm, device, "SetOn", (args.level,), {}])
+        elif args.on:
+            calls.append([plm, device, "SetOn", (), {}])
+    else:
+        if args.mode is not None:
+            calls.append([plm, device, "SetMode", (args.mode,), {}])
+        if args.heat is not None:
+            calls.append([plm, device, "SetHeatSetpoint", (args.heat,), {}])
+        if args.cool is not None:
+            calls.append([plm, device, "SetCoolSetpoint", (args.cool,), {}])
+    if not calls:
+        raise ValueError("nothing to set on " + args.device)
+    return _RunFleet(calls, args.jobs, args.attempts, args.timeout)
+
+
+def _Schedule(args, plms):
+    if args.action == "get":
+        calls = [
+            [plm, device, "GetSchedule", (), {}]
+            for [plm, device] in _Select(plms, args.devices, thermostat)
+        ]
+        results = _RunFleet(calls, args.jobs, args.attempts, args.timeout)
+        for [call, result] in zip(calls, results):
+            result["schedule"] = call[1].schedule
+        return results
+    if len(args.devices) <> 2:
+        raise ValueError("schedule set needs DEVICE FILE")
+    [[plm, device]] = _Select(plms, args.devices[:1])
+    scheduleFile = open(args.devices[1], "r")
+    try:
+        schedTable = json.load(scheduleFile)
+    finally:
+        scheduleFile.close()
+    calls = [[plm, device, "SetSchedule", (schedTable,), {}]]
+    return _RunFleet(calls, args.jobs, args.attempts, args.timeout)
+
+
+def _TimeSync(args, plms):
+    # one SyncThermostatClocks per PLM, through its queue, jobs at a time.
+    # Thermostats without a result by the end of the run are reported as
+    # timed out.
+    limit = threading.Semaphore(args.jobs)
+    deadline = time.time() + args.timeout
+    # id of the device to its result
+    results = {}
+    resultsLock = threading.Lock()
+    finished = [False]
+
+    def Work(plm, thermostats):
+        limit.acquire()
+        try:
+            plmResults = []
+            if not plm.Open(args.attempts):
+                for device in thermostats:
+                    plmResults.append(
+                        [device, _Result(plm, device, "SyncTime", updated=False)]
+                    )
+            elif time.time() < deadline:
+                plm.queue.Start()
+                try:
+                    updated = SyncThermostatClocks(
+                        thermostats,
+                        plm.connection,
+                        args.threshold,
+                        queue=plm.queue,
+                        timeout=deadline - time.time(),
+                    )
+                finally:
+                    plm.queue.Stop()
+                for device in thermostats:
+                    result = _Result(
+                        plm,
+                        device,
+                        "SyncTime",
+                        updated=device in updated,
+                        offset=device.PredictClockError(),
+                    )
+                    plmResults.append([device, result])
+            # results that come in after the run is reported are dropped
+            resultsLock.acquire()
+            if not finished[0]:
+                for [device, result] in plmResults:
+                    results[id(device)] = result
+            resultsLock.release()
+        finally:
+            limit.release()
+
+    threads = []
+    work = []
+    for plm in plms:
+        thermostats = [d for d in plm.devices if isinstance(d, thermostat)]
+        if thermostats:
+            work.append([plm, thermostats])
+            thread = threading.Thread(target=Work, args=(plm, thermostats))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+    for thread in threads:
+        thread.join(max(deadline - time.time(), 0) + 1)
+    resultsLock.acquire()
+    finished[0] = True
+    resultsLock.release()
+    reported = []
+    for [plm, thermostats] in work:
+        for device in thermostats:
+            if id(device) in results:
+                reported.append(results[id(device)])
+            else:
+                result = _Result(plm, device, "SyncTime", updated=False)
+                result.update({"error": True, "timedOut": True})
+                reported.append(result)
+    return reported
+
+
+def _Discover(args, config, plms):
+    from insteonProbe import deviceProbe
+
+    results = []
+    for plm in plms:
+        if args.addresses:
+            addresses = [ParseAddress(text) for text in args.addresses]
+        else:
+            addresses = [device.address for device in plm.devices]
+        if not plm.Open(args.attempts):
+            continue
+        probe = deviceProbe(plm.connection, config.get("probeCache"))
+        identities = probe.Probe(addresses, force=args.force)
+        for address in addresses:
+            key = AddressText(address)
+            identity = identities.get(key)
+            result = {"address": key, "port": plm.port, "found": identity is not None}
+            if identity is not None:
+                result["category"] = identity[0]
+                result["subcategory"] = identity[1]
+                result["firmware"] = identity[2]
+            results.append(result)
+        # only the first PLM is probed for addresses given on the command line
+        if args.addresses:
+            break
+    return results
+
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description="Insteon fleet operations")
+    parser.add_argument("-c", "--config", default="insteon.json")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="PLMs at once")
+    parser.add_argument(
+        "--attempts", type=int, default=1, help="tries to open each PLM port"
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=300, help="seconds for the whole run"
+    )
+    commands = parser.add_subparsers(dest="command")
+
+    pollParser = commands.add_parser("poll", help="read the device state")
+    pollParser.add_argument("--fast", action="store_true")
+    pollParser.add_argument("devices", nargs="*")
+
+    setParser = commands.add_parser("set", help="set a dimmer or thermostat")
+    setParser.add_argument("device")
+    setParser.add_argument("--on", action="store_true")
+    setParser.add_argument("--off", action="store_true")
+    setParser.add_argument("--level", type=int)
+    setParser.add_argument("--mode", type=int)
+    setParser.add_argument("--heat", type=float)
+    setParser.add_argument("--cool", type=float)
+
+    scheduleParser = commands.add_parser("schedule", help="get or set schedules")
+    scheduleParser.add_argument("action", choices=["get", "set"])
+    scheduleParser.add_argument("devices", nargs="*")
+
+    syncParser = commands.add_parser("time-sync", help="sync thermostat clocks")
+    syncParser.add_argument("--threshold", type=float, default=10)
+
+    discoverParser = commands.add_parser("discover", help="identify devices")
+    discoverParser.add_argument("--force", action="store_true")
+    discoverParser.add_argument("addresses", nargs="*")
+
+    args = parser.parse_args(argv)
+    if args.command == "set":
+        # out of range values would only fail later, in chr() on the PLM frame
+        for [option, value, low, high] in [
+            ["--level", args.level, 0, 100],
+            ["--mode", args.mode, 4, 10],
+            ["--heat", args.heat, 0, 127],
+            ["--cool", args.cool, 0, 127],
+        ]:
+            if (value is not None) and ((value < low) or (value > high)):
+                setParser.error(
+                    "%s must be from %d to %d, not %s" % (option, low, high, value)
+                )
+    # a device that stops answering fails the rest of its commands straight
+    # away instead of holding up its PLM for the whole run
+    EnableBreakers()
+    plms = []
+    try:
+        [config, plms] = LoadConfig(args.config)
+        if args.command == "poll":
+            results = _Poll(args, plms)
+        elif args.command == "set":
+            results = _Set(args, plms)
+        elif args.command == "schedule":
+            results = _Schedule(args, plms)
+        elif args.command == "time-sync":
+            results = _TimeSync(args, plms)
+        else:
+            results = _Discover(args, config, plms)
+    except (IOError, ValueError, KeyError), e:
+        print >> sys.stderr, "ERROR:", e
+        return 2
+    finally:
+        for plm in plms:
+            plm.Close()
+    print json.dumps({"results": results}, indent=1, sort_keys=True)
+    if any(result.get("error") for result in results):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(Main())
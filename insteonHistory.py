@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+"""
+ Insteon Thermostat History
+ provides a compact, append-only time series of thermostat readings.  The
+ readings of each thermostat are kept in one file per column, each value a
+ fixed-width binary number, so a record is 10 bytes on disk and a range of
+ the history loads straight into arrays from a memory map.  Besides every
+ reading, the history is rolled up into coarser resolutions as it is
+ recorded: the temperature and humidity are averaged over the interval,
+ the setpoints and mode are the last of the interval.
+
+ Directory layout:
+    <directory>/<address>/<resolution>.<column>
+    e.g. history/00.2B.8E/60.actualTemp, resolution 0 is every reading
+
+ Columns (native byte order):
+    time:       uint32, host time in whole seconds, start of the interval
+                for the rolled up resolutions
+    actualTemp: int16, 0.1C
+    actualHumi: uint8, percent
+    targetHeat: int8, C
+    targetCool: int8, C
+    mode:       uint8, readback mode (see thermostat.modeTextArray)
+
+ Classes:
+    historySeries: the column files of one thermostat at one resolution
+    historyRecorder: records thermostat readings after every GetState
+
+ History:
+    October 2026 - first version
+ """
+
+import array, mmap, os, struct
+from insteonDeviceClasses import (
+    clock,
+    thermostat,
+    Subscribe,
+    Unsubscribe,
+    AddressText,
+    EVENT_COMPLETE,
+)
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+# [column name, array type code] in record order
+historyColumns = [
+    ["time", "I"],
+    ["actualTemp", "h"],
+    ["actualHumi", "B"],
+    ["targetHeat", "b"],
+    ["targetCool", "b"],
+    ["mode", "B"],
+]
+timeField = struct.Struct("=I")
+
+
+def _Clip(value, low, high):
+    return int(min(max(value, low), high))
+
+
+class historySeries:
+    """
+    Column files of one thermostat at one resolution
+
+    VALUES:
+    path:
+        directory of the column files
+    resolution:
+        interval in seconds of the records, 0 for every reading
+    count:
+        number of records
+    firstTime, lastTime:
+        times of the first and last records, 0 if there are none
+
+    METHODS:
+    Append(values)
+        appends a record given as a list in historyColumns order
+    Count(start, end)
+        number of records with start <= time < end
+    Range(start, end)
+        dictionary by column name of arrays holding the records with
+        start <= time < end
+    Close()
+        closes the column files
+    """
+
+    def __init__(self, path, resolution):
+        self.path = path
+        self.resolution = resolution
+        self.files = []
+        for [name, typeCode] in historyColumns:
+            fileName = os.path.join(path, "%d.%s" % (resolution, name))
+            self.files.append(open(fileName, "ab"))
+        timeFile = os.path.join(path, "%d.time" % resolution)
+        self.count = os.path.getsize(timeFile) // timeField.size
+        self.firstTime = 0
+        self.lastTime = 0
+        if self.count:
+            times = self._Column("time")
+            self.firstTime = timeField.unpack_from(times, 0)[0]
+            self.lastTime = timeField.unpack_from(
+                times, (self.count - 1) * timeField.size
+            )[0]
+            times.close()
+
+    def _Column(self, name):
+        # read-only memory map of one column file, None while it is empty
+        fileName = os.path.join(self.path, "%d.%s" % (self.resolution, name))
+        if os.path.getsize(fileName) == 0:
+            return None
+        columnFile = open(fileName, "rb")
+        try:
+            return mmap.mmap(columnFile.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            columnFile.close()
+
+    def Append(self, values):
+        for [columnFile, [name, typeCode], value] in zip(
+            self.files, historyColumns, values
+        ):
+            columnFile.write(array.array(typeCode, [value]).tostring())
+            columnFile.flush()
+        if self.count == 0:
+            self.firstTime = values[0]
+        self.count += 1
+        self.lastTime = values[0]
+
+    def _Bisect(self, times, value):
+        # index of the first record with time >= value
+        [low, high] = [0, self.count]
+        while low < high:
+            middle = (low + high) // 2
+            if timeField.unpack_from(times, middle * timeField.size)[0] < value:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _Indices(self, start, end):
+        # [first, last] record indices of start <= time < end
+        times = self._Column("time")
+        if times is None:
+            return [0, 0]
+        try:
+            first = 0 if start is None else self._Bisect(times, int(start))
+            last = self.count if end is None else self._Bisect(times, int(end))
+        finally:
+            times.close()
+        return [first, last]
+
+    def Count(self, start=None, end=None):
+        [first, last] = self._Indices(start, end)
+        return max(last - first, 0)
+
+    def Range(self, start=None, end=None):
+        result = dict(
+            (name, array.array(typeCode)) for [name, typeCode] in historyColumns
+        )
+        [first, last] = self._Indices(start, end)
+        if first >= last:
+            return result
+        for [name, typeCode] in historyColumns:
+            column = self._Column(name)
+            try:
+                size = result[name].itemsize
+                result[name].fromstring(column[first * size : last * size])
+            finally:
+                column.close()
+        return result
+
+    def Close(self):
+        for columnFile in self.files:
+            columnFile.close()
+
+
+class historyRecorder:
+    """
+    Records thermostat readings after every GetState
+
+    VALUES:
+    directory:
+        directory holding one sub-directory per thermostat
+    resolutions:
+        intervals in seconds kept for every thermostat, 0 for every reading
+        (default 0, 60, 900 and 3600)
+
+    METHODS:
+    Start()
+        starts recording every thermostat GetState without errors
+    Stop()
+        stops recording
+    Record(device, hostTime)
+        records the current values of a thermostat
+    Query(address, start, end, resolution, maxPoints)
+        dictionary by column name of arrays of the history of the
+        thermostat with start <= time < end.  With maxPoints the finest
+        resolution giving no more than maxPoints records is used instead
+        of resolution.  A resolution not in resolutions raises ValueError
+    Close()
+        stops recording, writes the intervals still filling and closes the
+        files
+    """
+
+    def __init__(self, directory, resolutions=(0, 60, 900, 3600)):
+        self.directory = directory
+        self.resolutions = sorted(resolutions)
+        self.series = {}
+        self.rollups = {}
+        self.subscription = None
+
+    def _Series(self, address):
+        if address not in self.series:
+            path = os.path.join(self.directory, address)
+            if not os.path.isdir(path):
+                os.makedirs(path)
+            self.series[address] = dict(
+                (resolution, historySeries(path, resolution))
+                for resolution in self.resolutions
+            )
+            self.rollups[address] = dict(
+                (resolution, None) for resolution in self.resolutions if resolution
+            )
+        return self.series[address]
+
+    def _Event(self, event):
+        if (
+            isinstance(event.device, thermostat)
+            and (event.field == "GetState")
+            and not event.new
+        ):
+            self.Record(event.device, event.time)
+
+    def Start(self):
+        if self.subscription is None:
+            self.subscription = Subscribe(self._Event, [EVENT_COMPLETE])
+
+    def Stop(self):
+        if self.subscription is not None:
+            Unsubscribe(self.subscription)
+            self.subscription = None
+
+    def Record(self, device, hostTime=None):
+        if hostTime is None:
+            hostTime = clock.time()
+        address = AddressText(device.address)
+        series = self._Series(address)
+        temp = _Clip(round(device.actualTemp * 10), -32768, 32767)
+        humi = _Clip(device.actualHumi, 0, 255)
+        heat = _Clip(device.targetHeat, -128, 127)
+        cool = _Clip(device.targetCool, -128, 127)
+        mode = _Clip(device.mode, 0, 255)
+        now = int(hostTime)
+        for resolution in self.resolutions:
+            if resolution == 0:
+                series[0].Append([now, temp, humi, heat, cool, mode])
+                continue
+            bucket = now - now % resolution
+            rollup = self.rollups[address][resolution]
+            if (rollup is not None) and (rollup[0] <> bucket):
+                # the interval is over, write its averages
+                self._WriteRollup(series[resolution], rollup)
+                rollup = None
+            if rollup is None:
+                rollup = [bucket, 0, 0, 0, heat, cool, mode]
+            rollup[1] += 1
+            rollup[2] += temp
+            rollup[3] += humi
+            rollup[4:7] = [heat, cool, mode]
+            self.rollups[address][resolution] = rollup
+
+    def _WriteRollup(self, series, rollup):
+        [start, count, sumTemp, sumHumi, lastHeat, lastCool, lastMode] = rollup
+        # an interval already written before a restart isn't repeated
+        if (series.count == 0) or (start > series.lastTime):
+            series.Append(
+                [
+                    start,
+                    int(round(float(sumTemp) / count)),
+                    int(round(float(sumHumi) / count)),
+                    lastHeat,
+                    lastCool,
+                    lastMode,
+                ]
+            )
+
+    def Query(self, address, start=None, end=None, resolution=0, maxPoints=None):
+        if resolution not in self.resolutions:
+            raise ValueError(
+                "history resolution %s is not one of %s"
+                % (resolution, ", ".join(str(r) for r in self.resolutions))
+            )
+        if not isinstance(address, str):
+            address = AddressText(address)
+        address = address.upper()
+        if (address not in self.series) and not os.path.isdir(
+            os.path.join(self.directory, address)
+        ):
+            # nothing recorded, and nothing is created for asking
+            return dict(
+                (name, array.array(typeCode)) for [name, typeCode] in historyColumns
+            )
+        series = self._Series(address)
+        if maxPoints is not None:
+            if start is None:
+                first = series[self.resolutions[0]].firstTime
+            else:
+                first = start
+            span = (end or clock.time()) - first
+            for resolution in self.resolutions:
+                if resolution == 0:
+                    # every reading, only if there are few enough of them
+                    if series[0].Count(start, end) <= maxPoints:
+                        break
+                elif span / resolution <= maxPoints:
+                    break
+        return series[resolution].Range(start, end)
+
+    def Close(self):
+        self.Stop()
+        for [address, rollups] in self.rollups.items():
+            for [resolution, rollup] in rollups.items():
+                if rollup is not None:
+                    self._WriteRollup(self.series[address][resolution], rollup)
+        for series in self.series.values():
+            for resolutionSeries in series.values():
+                resolutionSeries.Close()
+        self.series = {}
+        self.rollups = {}
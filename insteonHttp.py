@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+"""
+ Insteon HTTP State Endpoint
+ provides a small read-only JSON/HTTP server for the state of the device
+ instances of insteonDeviceClasses held by the process that owns the PLM.
+ Every response is built from the device attributes in memory, no request
+ ever causes traffic to the PLM.
+
+ Endpoints:
+    GET /devices            state of every device
+    GET /devices/<address>  state of one device, address as on the label,
+                            e.g. /devices/00.2B.8E
+    GET /errors             addresses of the devices with errorStatus set
+
+ Responses carry an ETag, and a request with a matching If-None-Match
+ header gets a 304 Not Modified with no body.
+
+ Classes:
+    stateServer: threaded HTTP server for the device state
+
+ History:
+    October 2026 - first version
+ """
+
+import hashlib, json, threading
+import BaseHTTPServer, SocketServer
+from insteonDeviceClasses import AddressText
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+
+class stateRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # the server attribute is the stateServer's httpServer, which has a
+    # reference back to the stateServer in owner
+
+    def do_GET(self):
+        owner = self.server.owner
+        path = self.path.split("?")[0].rstrip("/")
+        if path == "/devices":
+            body = {"devices": [device.State() for device in owner.devices]}
+        elif path.startswith("/devices/"):
+            address = path[len("/devices/") :].upper()
+            body = None
+            for device in owner.devices:
+                if AddressText(device.address) == address:
+                    body = device.State()
+            if body is None:
+                self.send_error(404, "unknown device " + address)
+                return
+        elif path == "/errors":
+            body = {
+                "errors": [
+                    AddressText(device.address)
+                    for device in owner.devices
+                    if device.errorStatus
+                ]
+            }
+        else:
+            self.send_error(404)
+            return
+        text = json.dumps(body, sort_keys=True)
+        etag = '"' + hashlib.md5(text).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(text)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, format, *args):
+        if self.server.owner.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class threadingHttpServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class stateServer:
+    """
+    Read-only JSON/HTTP server for the state of Insteon devices
+
+    VALUES:
+    devices:
+        list of the dimmer and thermostat instances served
+    host, port:
+        address the server listens on (default 127.0.0.1:8080), port 0
+        picks a free port, which is saved in port once started
+    verbose:
+        True logs each request to stderr
+
+    METHODS:
+    Add(device)
+        adds a device to the list served
+    Start()
+        starts serving from a background thread
+    Stop()
+        stops the server
+    """
+
+    def __init__(self, devices=[], host="127.0.0.1", port=8080):
+        self.devices = list(devices)
+        self.host = host
+        self.port = port
+        self.verbose = False
+        self.httpServer = None
+        self.thread = None
+
+    def Add(self, device):
+        self.devices.append(device)
+
+    def Start(self):
+        if self.httpServer is None:
+            self.httpServer = threadingHttpServer(
+                (self.host, self.port), stateRequestHandler
+            )
+            self.httpServer.owner = self
+            self.port = self.httpServer.server_address[1]
+            self.thread = threading.Thread(target=self.httpServer.serve_forever)
+            self.thread.daemon = True
+            self.thread.start()
+
+    def Stop(self):
+        if self.httpServer is not None:
+            self.httpServer.shutdown()
+            self.httpServer.server_close()
+            self.thread.join()
+            self.httpServer = None
+            self.thread = None
@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+"""
+ Insteon PLM Link Table
+ provides a backup of the ALL-Link database of the PLM to a compact file
+ and a restore of it to the same or a replacement PLM, so that a modem can
+ be swapped without linking every device again by hand.
+
+ The database is read with Get First/Next ALL-Link Record (0x69/0x6A),
+ each record arriving as an ALL-Link Record Response (0x57).  The restore
+ writes with Manage ALL-Link Record (0x6F), sending the next record as soon
+ as the modem has accepted the last ones, skips the records that are
+ already in the modem and reads the database back to verify.  A busy modem
+ (0x15) gets the record again after a short wait, as often as it takes
+ until the restore timeout; only records that get no answer at all use up
+ their retries.  Writing a record twice does no harm, it is modified
+ rather than added the second time.
+
+ Records are lists of 8 integers:
+    [flags, group, id_high, id_mid, id_low, data1, data2, data3]
+    flags bit 7 set for a record in use, bit 6 set if the PLM is the
+    controller of the link, clear if it is a responder
+
+ File layout:
+    8 byte magic "INSTLNK1", uint16 number of records (little endian),
+    then the records, 8 bytes each
+
+ Functions:
+    ReadLinkTable: reads every record in use from the PLM
+    SaveLinks: writes records to a link file
+    LoadLinks: reads records from a link file
+    BackupLinks: reads the PLM link table and saves it to a file
+    RestoreLinks: writes the records of a link file to the PLM
+
+ History:
+    October 2026 - first version
+ """
+
+import struct
+from insteonDeviceClasses import clock, imMessageLengths, ReadMessage
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+LINKS_MAGIC = "INSTLNK1"
+linksHeader = struct.Struct("<8sH")
+
+# Manage ALL-Link Record control code: modify the first record found with
+# the same controller/responder bit, group and id, or add it if there is none
+MANAGE_MODIFY_OR_ADD = 0x20
+
+# seconds to wait before sending again to a busy modem
+busyDelay = 0.1
+
+
+def _LinkKey(record):
+    # records with the same key are the same link, maybe with other data
+    return (record[0] & 0x40,) + tuple(record[1:5])
+
+
+def _SameLink(a, b):
+    return (_LinkKey(a) == _LinkKey(b)) and (a[5:8] == b[5:8])
+
+
+def _Locked(plmSerial):
+    # takes the transaction lock of a plmConnection (insteonPlm), returns
+    # True if there was one to take
+    if hasattr(plmSerial, "Acquire"):
+        plmSerial.Acquire()
+        return True
+    return False
+
+
+def ReadLinkTable(plmSerial, verbose=False):
+    # reads every record in use from the PLM link database
+    # returns [records, error boolean]
+    managed = _Locked(plmSerial)
+    try:
+        plmSerial.flushInput()
+        plmSerial.flushOutput()
+        records = []
+        command = chr(0x02) + chr(0x69)
+        while True:
+            plmSerial.write(command)
+            echo = ReadMessage(plmSerial)
+            while echo and (echo[:2] <> command):
+                echo = ReadMessage(plmSerial)
+            if not echo:
+                if verbose:
+                    print "ERROR: ReadLinkTable no answer from PLM"
+                return [records, True]
+            if echo[2] <> chr(0x06):
+                # NAK, no (more) records
+                return [records, False]
+            response = ReadMessage(plmSerial)
+            while response and (response[1] <> chr(0x57)):
+                response = ReadMessage(plmSerial)
+            if not response:
+                if verbose:
+                    print "ERROR: ReadLinkTable record missing"
+                return [records, True]
+            record = [ord(c) for c in response[2:10]]
+            if record[0] & 0x80:
+                records.append(record)
+            command = chr(0x02) + chr(0x6A)
+    finally:
+        if managed:
+            plmSerial.Release()
+
+
+def SaveLinks(records, fileName):
+    linksFile = open(fileName, "wb")
+    try:
+        linksFile.write(linksHeader.pack(LINKS_MAGIC, len(records)))
+        for record in records:
+            linksFile.write("".join(chr(value) for value in record))
+    finally:
+        linksFile.close()
+
+
+def LoadLinks(fileName):
+    linksFile = open(fileName, "rb")
+    try:
+        data = linksFile.read()
+    finally:
+        linksFile.close()
+    [magic, nRecords] = linksHeader.unpack_from(data, 0)
+    if magic <> LINKS_MAGIC:
+        raise ValueError("not an Insteon link file: " + fileName)
+    if len(data) <> linksHeader.size + 8 * nRecords:
+        raise ValueError("truncated Insteon link file: " + fileName)
+    return [
+        [ord(c) for c in data[offset : offset + 8]]
+        for offset in range(linksHeader.size, len(data), 8)
+    ]
+
+
+def BackupLinks(plmSerial, fileName, verbose=False):
+    # returns [number of records saved, error boolean], nothing is saved if
+    # the table could not be read completely
+    [records, error] = ReadLinkTable(plmSerial, verbose)
+    if not error:
+        SaveLinks(records, fileName)
+    return [len(records), error]
+
+
+def _ReadReply(plmSerial):
+    # like ReadMessage, but a lone NAK (0x15) of a busy modem is returned
+    # rather than skipped
+    start = plmSerial.read(1)
+    while start and (start not in [chr(0x02), chr(0x15)]):
+        start = plmSerial.read(1)
+    if start <> chr(0x02):
+        return start
+    code = plmSerial.read(1)
+    if not code:
+        return ""
+    length = imMessageLengths.get(ord(code), 2)
+    message = start + code + plmSerial.read(length - 2)
+    if len(message) <> length:
+        return ""
+    return message
+
+
+def _WriteLinks(plmSerial, records, window, retries, deadline, verbose):
+    # Manage ALL-Link Record for each record, up to window commands waiting
+    # for their echo at once.  Busy NAKs are sent again until the deadline
+    # (clock time), records without any answer have retries tries more.
+    # Returns the records that failed.
+    queue = [[record, retries] for record in records]
+    outstanding = []
+    failed = []
+    busy = False
+    nakSeen = False
+    while queue or outstanding:
+        if clock.time() > deadline:
+            failed.extend(record for [record, triesLeft] in queue)
+            failed.extend(record for [command, record, triesLeft] in outstanding)
+            if verbose:
+                print "ERROR: RestoreLinks timed out"
+            break
+        if busy:
+            clock.sleep(busyDelay)
+            busy = False
+        while queue and len(outstanding) < window:
+            [record, triesLeft] = queue.pop(0)
+            command = (
+                chr(0x02)
+                + chr(0x6F)
+                + chr(MANAGE_MODIFY_OR_ADD)
+                + "".join(chr(value) for value in record)
+            )
+            plmSerial.write(command)
+            outstanding.append([command, record, triesLeft])
+        echo = _ReadReply(plmSerial)
+        if echo == chr(0x15):
+            # the modem was too busy to take a command, its echo won't come
+            busy = True
+            nakSeen = True
+            continue
+        if not echo:
+            # nothing more is coming for what was sent, send it again.  A
+            # modem that said it was busy answered, so no try is used up.
+            for [command, record, triesLeft] in outstanding:
+                if nakSeen:
+                    queue.append([record, triesLeft])
+                elif triesLeft > 0:
+                    queue.append([record, triesLeft - 1])
+                else:
+                    failed.append(record)
+            outstanding = []
+            nakSeen = False
+            continue
+        for entry in outstanding:
+            if echo[:11] == entry[0]:
+                outstanding.remove(entry)
+                [command, record, triesLeft] = entry
+                if echo[11] == chr(0x06):
+                    if verbose:
+                        print "    link written", record
+                else:
+                    # NAK, the modem was busy
+                    queue.append([record, triesLeft])
+                    busy = True
+                break
+    return failed
+
+
+def RestoreLinks(
+    plmSerial, fileName, window=4, retries=2, verify=True, verbose=False, timeout=60
+):
+    # writes the records of a link file to the PLM, skipping those already
+    # in its link table, and reads the table back to verify
+    # timeout: seconds for writing the records, however busy the modem is
+    # returns a dictionary of the numbers of records written, skipped and
+    # failed and the list of records missing after the restore (records
+    # still to be written if the table couldn't be read back)
+    records = LoadLinks(fileName)
+    [current, error] = ReadLinkTable(plmSerial, verbose)
+    if error:
+        # without the current table everything is written
+        current = []
+    toWrite = [
+        record
+        for record in records
+        if not any(_SameLink(record, other) for other in current)
+    ]
+    managed = _Locked(plmSerial)
+    try:
+        plmSerial.flushInput()
+        plmSerial.flushOutput()
+        deadline = clock.time() + timeout
+        failed = _WriteLinks(plmSerial, toWrite, window, retries, deadline, verbose)
+    finally:
+        if managed:
+            plmSerial.Release()
+    result = {
+        "written": len(toWrite) - len(failed),
+        "skipped": len(records) - len(toWrite),
+        "failed": len(failed),
+        "missing": failed,
+    }
+    if verify:
+        [current, error] = ReadLinkTable(plmSerial, verbose)
+        if not error:
+            result["missing"] = [
+                record
+                for record in records
+                if not any(_SameLink(record, other) for other in current)
+            ]
+    return result
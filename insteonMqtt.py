@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+ Insteon MQTT Bridge
+ publishes the state of dimmers and thermostats to MQTT and turns set
+ messages into device commands.  A retained topic per device field is only
+ published when its value changes, and the changes from a burst such as a
+ poll of the whole fleet are collected for batchDelay seconds and sent
+ together.  Set messages are submitted to one commandQueue (insteonQueue),
+ so the PLM only ever sees one command at a time.
+
+ Topics, for prefix "insteon" and device 00.2B.8E:
+    insteon/00.2B.8E/<field>        retained JSON value of each field of
+                                    the device State(), e.g. lastGetLevel
+    insteon/00.2B.8E/set/on         payload: level in percent, or empty
+    insteon/00.2B.8E/set/off        payload: ignored
+    insteon/00.2B.8E/set/mode       payload: SetMode value
+    insteon/00.2B.8E/set/heat       payload: heat setpoint in C
+    insteon/00.2B.8E/set/cool       payload: cool setpoint in C
+    insteon/00.2B.8E/set/schedule   payload: JSON 7 row schedule table,
+                                    rows as read by GetSchedule
+
+ The client is passed in: anything with the publish(), subscribe() and
+ on_message of a paho-mqtt client, such as the localBroker stand-in here.
+ paho-mqtt itself is only imported by PahoClient().
+
+ Classes:
+    localBroker: in-process stand-in for a broker and client
+    mqttBridge: change-only publishing and set topics
+
+ Functions:
+    PahoClient: connected paho-mqtt client, needs paho-mqtt installed
+    TopicMatches: MQTT topic filter match with wildcards
+
+ History:
+    October 2026 - first version
+ """
+
+import json, threading
+from insteonDeviceClasses import (
+    dimmer,
+    thermostat,
+    Subscribe,
+    Unsubscribe,
+    AddressText,
+    EVENT_CHANGE,
+    EVENT_ERROR,
+)
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+
+def PahoClient(host, port=1883, clientId=""):
+    # connected paho-mqtt client with its network loop running
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        raise ImportError("the MQTT bridge needs paho-mqtt: pip install paho-mqtt")
+    client = mqtt.Client(clientId)
+    client.connect(host, port)
+    client.loop_start()
+    return client
+
+
+def TopicMatches(pattern, topic):
+    # MQTT topic filter match with the + and # wildcards
+    patternLevels = pattern.split("/")
+    topicLevels = topic.split("/")
+    for [iLevel, level] in enumerate(patternLevels):
+        if level == "#":
+            return True
+        if iLevel >= len(topicLevels):
+            return False
+        if (level <> "+") and (level <> topicLevels[iLevel]):
+            return False
+    return len(patternLevels) == len(topicLevels)
+
+
+def _Number(value, low, high):
+    # a JSON number (not true or false) from low to high, else None
+    if isinstance(value, bool) or not isinstance(value, (int, long, float)):
+        return None
+    if (value < low) or (value > high):
+        return None
+    return value
+
+
+def _Integer(value, low, high):
+    # an integer, or the text of one as GetSchedule keeps them, from low to
+    # high, else None
+    if isinstance(value, basestring):
+        try:
+            value = int(value)
+        except ValueError:
+            return None
+    elif isinstance(value, bool) or not isinstance(value, (int, long)):
+        return None
+    if (value < low) or (value > high):
+        return None
+    return value
+
+
+def _ScheduleRow(row):
+    # True if row is a day of the schedule that SetSchedule can send: the 17
+    # fields of a GetSchedule row, the day 0 to 6, the four times "H:MM" (or
+    # "H:MM:SS") and the setpoints 0 to 255
+    if not (isinstance(row, list) and len(row) == 17):
+        return False
+    if _Integer(row[4], 0, 6) is None:
+        return False
+    for iPeriod in range(4):
+        iCol = iPeriod * 3 + 5
+        if not isinstance(row[iCol], basestring):
+            return False
+        parts = row[iCol].split(":")
+        if (len(parts) not in [2, 3]) or not all([p.isdigit() for p in parts]):
+            return False
+        if [len(p) for p in parts[1:]] <> [2] * (len(parts) - 1):
+            return False
+        if (int(parts[0]) > 23) or (max([int(p) for p in parts[1:]]) > 59):
+            return False
+        if None in [_Integer(value, 0, 255) for value in row[iCol + 1 : iCol + 3]]:
+            return False
+    return True
+
+
+class mqttMessage:
+    # message handed to on_message, like the paho MQTTMessage
+    def __init__(self, topic, payload, retain):
+        self.topic = topic
+        self.payload = payload
+        self.retain = retain
+
+
+class localBroker:
+    """
+    In-process stand-in for an MQTT broker and client
+    Delivers every publish straight to the matching subscriptions and
+    keeps the retained messages, for running the bridge without a broker.
+
+    VALUES:
+    retained:
+        dictionary by topic of the last retained payload
+    messages:
+        list of [topic, payload, retain] of every publish
+    on_message:
+        callback(client, userdata, message) for subscribed topics
+
+    METHODS:
+    publish(topic, payload, qos, retain)
+    subscribe(topic, qos)
+    """
+
+    def __init__(self):
+        self.retained = {}
+        self.messages = []
+        self.subscriptions = []
+        self.on_message = None
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.messages.append([topic, payload, retain])
+        if retain:
+            self.retained[topic] = payload
+        if self.on_message is not None:
+            for pattern in self.subscriptions:
+                if TopicMatches(pattern, topic):
+                    self.on_message(self, None, mqttMessage(topic, payload, retain))
+                    break
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+
+# set topic to the device method it is submitted as
+setMethods = {
+    "on": "SetOn",
+    "off": "SetOff",
+    "mode": "SetMode",
+    "heat": "SetHeatSetpoint",
+    "cool": "SetCoolSetpoint",
+    "schedule": "SetSchedule",
+}
+
+
+class mqttBridge:
+    """
+    MQTT bridge for dimmers and thermostats
+
+    VALUES:
+    client:
+        MQTT client, see PahoClient() and localBroker
+    queue:
+        commandQueue the set commands are submitted to, start its worker
+        (queue.Start()) for them to be sent as they arrive
+    devices:
+        list of the dimmer and thermostat instances bridged
+    prefix:
+        first level of every topic (default "insteon")
+    batchDelay:
+        seconds changes are collected before they are published (default 0.2)
+    nPublished, nSubmitted:
+        counts of the messages published and set commands submitted
+
+    METHODS:
+    Start()
+        publishes the current state and follows device changes and set topics
+    Stop()
+        stops following device changes, publishing what is still waiting
+    Flush()
+        publishes the waiting changes now
+    """
+
+    def __init__(self, client, queue, devices, prefix="insteon", batchDelay=0.2):
+        self.client = client
+        self.queue = queue
+        self.devices = list(devices)
+        self.prefix = prefix
+        self.batchDelay = batchDelay
+        self.nPublished = 0
+        self.nSubmitted = 0
+        self.verbose = False
+        self.lock = threading.Lock()
+        self.waiting = {}
+        self.published = {}
+        self.timer = None
+        self.subscription = None
+
+    def _Topic(self, device, field):
+        return self.prefix + "/" + AddressText(device.address) + "/" + field
+
+    def _Add(self, device, field, value):
+        # called with the lock held
+        self.waiting[self._Topic(device, field)] = value
+        if self.timer is None:
+            self.timer = threading.Timer(self.batchDelay, self.Flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _Event(self, event):
+        if event.device not in self.devices:
+            return
+        self.lock.acquire()
+        try:
+            self._Add(event.device, event.field, event.new)
+            if event.field == "mode":
+                # modeText is set after mode, so it isn't changed yet
+                modeTextArray = event.device.modeTextArray
+                if 0 <= event.new < len(modeTextArray):
+                    self._Add(event.device, "modeText", modeTextArray[event.new])
+        finally:
+            self.lock.release()
+
+    def Flush(self):
+        self.lock.acquire()
+        try:
+            waiting = self.waiting
+            self.waiting = {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        finally:
+            self.lock.release()
+        for topic in sorted(waiting):
+            payload = json.dumps(waiting[topic])
+            # a value that changed and changed back within the batch
+            if self.published.get(topic) == payload:
+                continue
+            self.client.publish(topic, payload, 1, True)
+            self.published[topic] = payload
+            self.nPublished += 1
+
+    def _Message(self, client, userdata, message):
+        # <prefix>/<address>/set/<command>
+        levels = message.topic.split("/")
+        if len(levels) < 4 or levels[-2] <> "set":
+            return
+        [address, command] = [levels[-3].upper(), levels[-1]]
+        devices = [d for d in self.devices if AddressText(d.address) == address]
+        if not devices:
+            return
+        device = devices[0]
+        try:
+            payload = message.payload
+            value = json.loads(payload) if payload else None
+        except ValueError:
+            if self.verbose:
+                print "ERROR: MQTT bad payload on", message.topic
+            return
+        # the payload is checked here, a bad one would only fail later in
+        # the queue worker
+        args = (value,)
+        if isinstance(device, dimmer) and command == "on":
+            if value is None:
+                args = ()
+            elif _Number(value, 0, 100) is not None:
+                args = (int(value),)
+            else:
+                args = None
+        elif isinstance(device, dimmer) and command == "off":
+            args = ()
+        elif isinstance(device, thermostat) and command == "mode":
+            if (_Number(value, 4, 10) is None) or (value <> int(value)):
+                args = None
+            else:
+                args = (int(value),)
+        elif isinstance(device, thermostat) and command in ["heat", "cool"]:
+            if _Number(value, 0, 127) is None:
+                args = None
+        elif isinstance(device, thermostat) and command == "schedule":
+            if not (isinstance(value, list) and len(value) == 7):
+                args = None
+            elif not all([_ScheduleRow(row) for row in value]):
+                args = None
+        else:
+            if self.verbose:
+                print "ERROR: MQTT unknown set topic", message.topic
+            return
+        if args is None:
+            if self.verbose:
+                print "ERROR: MQTT bad payload on", message.topic
+            return
+        self.queue.Submit(device, setMethods[command], *args)
+        self.nSubmitted += 1
+
+    def Start(self):
+        if self.subscription is not None:
+            return
+        self.lock.acquire()
+        try:
+            for device in self.devices:
+                for [field, value] in device.State().items():
+                    if field not in ["address", "type"]:
+                        self._Add(device, field, value)
+        finally:
+            self.lock.release()
+        self.Flush()
+        self.subscription = Subscribe(self._Event, [EVENT_CHANGE, EVENT_ERROR])
+        self.client.on_message = self._Message
+        self.client.subscribe(self.prefix + "/+/set/+", 1)
+
+    def Stop(self):
+        if self.subscription is not None:
+            Unsubscribe(self.subscription)
+            self.subscription = None
+        self.Flush()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+"""
+ Insteon PLM Connection
+ provides a managed serial connection to the power line modem (PLM).  The
+ connection object is used in place of the serial port handle by the
+ functions and device classes in insteonDeviceClasses.  A watchdog thread
+ reopens the port as soon as the device path comes back after the PLM is
+ unplugged or re-enumerated, and probes the modem with Get IM Info (0x60)
+ when it goes quiet or stops answering.
+
+ Classes:
+    plmConnection: serial port handle of the PLM with reconnect and watchdog
+
+ History:
+    October 2026 - first version
+ """
+
+import os, threading, time
+from insteonDeviceClasses import clock
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+
+class plmConnection:
+    """
+    Managed serial connection to the PLM
+    Pass an instance anywhere a PLM serial handle is used.  While the PLM is
+    missing or unhealthy, reads return nothing and writes are dropped so
+    that calls fail straight away instead of waiting out the read timeout.
+    A commandQueue (insteonQueue) given a plmConnection holds its commands
+    until the connection is healthy again instead of sending them to fail.
+
+    VALUES:
+    port:
+        device path (e.g. "/dev/ttyUSB0") or port name (e.g. "COM3")
+    baudrate:
+        serial baud rate, 19200 is standard for Insteon PLMs
+    timeout:
+        serial read timeout in seconds (default 2)
+    ser:
+        the pyserial handle, None while the port is closed
+    healthy:
+        True when the port is open and the modem answered its last probe
+    imInfo:
+        [id_high, id_mid, id_low, category, subcategory, firmware] from the
+        last successful Get IM Info
+    pollInterval:
+        seconds between checks of the device path (default 0.5)
+    probeInterval:
+        seconds of inactivity before the modem is probed (default 60)
+    missedLimit:
+        consecutive short reads before the modem is probed (default 3)
+    recoverInterval:
+        seconds before the first retry of a failed recovery, doubled for
+        every retry up to probeInterval (default 1)
+    allowImReset:
+        True lets the watchdog send Reset IM (0x67) if the modem still
+        doesn't answer after the port is reopened.  Note that this clears
+        the ALL-Link database of the modem, so it is False by default.
+    lock:
+        re-entrant lock held for the duration of a transaction
+    verbose:
+        True prints connection changes to stdout
+
+    METHODS:
+    Open(attempts, wait)
+        opens the port, trying attempts times wait seconds apart
+    Close()
+        closes the port
+    Probe()
+        sends Get IM Info, returns True if the modem answered
+    Recover()
+        reopens the port and probes, resetting the modem if allowed
+    Acquire(timeout)
+        waits for a healthy connection then takes the lock, returns True
+        if it did
+    Release()
+        releases the lock
+    Start()
+        starts the watchdog thread
+    Stop()
+        stops the watchdog thread
+    """
+
+    def __init__(self, port, baudrate=19200, timeout=2):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.ser = None
+        self.healthy = False
+        self.imInfo = None
+        self.pollInterval = 0.5
+        self.probeInterval = 60.0
+        self.missedLimit = 3
+        self.recoverInterval = 1.0
+        self.recoverDelay = 0.0
+        self.nextRecover = 0.0
+        self.allowImReset = False
+        self.verbose = False
+        self.lock = threading.RLock()
+        self.ready = threading.Condition(threading.Lock())
+        self.lastActivity = 0.0
+        self.missedReads = 0
+        self.devId = None
+        self.watchdog = None
+        self.running = False
+
+    def __setattr__(self, name, value):
+        self.__dict__[name] = value
+        # StdCmd and friends adjust the read timeout for each transaction
+        if name == "timeout" and self.__dict__.get("ser") is not None:
+            try:
+                self.ser.timeout = value
+            except Exception:
+                pass
+
+    def _DevId(self):
+        # identifies the device node so a re-enumeration is noticed even if
+        # the path never went away.  Only for unix style device paths.
+        if not self.port.startswith("/"):
+            return None
+        try:
+            st = os.stat(self.port)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_rdev)
+
+    def _SetHealthy(self, healthy):
+        self.ready.acquire()
+        if healthy and not self.healthy and self.verbose:
+            print "INFO: PLM connection ready on", self.port
+        elif not healthy and self.healthy and self.verbose:
+            print "ERROR: PLM connection lost on", self.port
+        self.healthy = healthy
+        self.ready.notifyAll()
+        self.ready.release()
+
+    def _OpenOnce(self):
+        # serial is only needed once we actually talk to a PLM
+        import serial
+
+        try:
+            ser = serial.Serial(self.port, self.baudrate, timeout=self.timeout)
+            ser.bytesize = serial.EIGHTBITS  # number of bits per bytes
+            ser.parity = serial.PARITY_NONE  # set parity check: no parity
+            ser.stopbits = serial.STOPBITS_ONE  # number of stop bits
+            ser.xonxoff = False  # disable software flow control
+            ser.rtscts = False  # disable hardware (RTS/CTS) flow control
+            ser.dsrdtr = False  # disable hardware (DSR/DTR) flow control
+            ser.writeTimeout = 0  # timeout for write
+        except Exception, e:
+            if self.verbose:
+                print "ERROR: opening serial port PLM connection: " + str(e)
+            return False
+        self.ser = ser
+        self.devId = self._DevId()
+        self.missedReads = 0
+        self.lastActivity = time.time()
+        return True
+
+    def Open(self, attempts=1, wait=30):
+        self.lock.acquire()
+        try:
+            for attempt in range(attempts):
+                if attempt > 0:
+                    clock.sleep(wait)
+                if self._OpenOnce():
+                    self._SetHealthy(True)
+                    return True
+            return False
+        finally:
+            self.lock.release()
+
+    def Close(self):
+        self.lock.acquire()
+        try:
+            self._SetHealthy(False)
+            if self.ser is not None:
+                try:
+                    self.ser.close()
+                except Exception:
+                    pass
+                self.ser = None
+        finally:
+            self.lock.release()
+
+    def _Lost(self):
+        # the handle failed underneath us, drop it and let the watchdog reopen
+        if self.ser is not None:
+            try:
+                self.ser.close()
+            except Exception:
+                pass
+            self.ser = None
+        self._SetHealthy(False)
+
+    # serial handle interface used by StdCmd, ExtCrc, ExtChecksum, which
+    # fails straight away while the connection is unhealthy
+    def write(self, data):
+        if not self.healthy:
+            return 0
+        return self._Write(data)
+
+    def read(self, size=1):
+        if not self.healthy:
+            return ""
+        return self._Read(size)
+
+    # the probes talk to the modem while it is still unhealthy
+    def _Write(self, data):
+        if self.ser is None:
+            return 0
+        self.lastActivity = time.time()
+        try:
+            return self.ser.write(data)
+        except Exception:
+            self._Lost()
+            return 0
+
+    def _Read(self, size=1):
+        if self.ser is None:
+            return ""
+        try:
+            data = self.ser.read(size)
+        except Exception:
+            self._Lost()
+            return ""
+        self.lastActivity = time.time()
+        if len(data) < size:
+            self.missedReads += 1
+        else:
+            self.missedReads = 0
+        return data
+
+    def flushInput(self):
+        if self.ser is not None:
+            try:
+                self.ser.flushInput()
+            except Exception:
+                self._Lost()
+
+    def flushOutput(self):
+        if self.ser is not None:
+            try:
+                self.ser.flushOutput()
+            except Exception:
+                self._Lost()
+
+    def close(self):
+        self.Close()
+
+    def Probe(self):
+        # Get IM Info: 0x02 0x60 -> 0x02 0x60 id id id cat subcat fw 0x06
+        self.lock.acquire()
+        try:
+            if self.ser is None:
+                return False
+            self.flushInput()
+            self._Write(chr(0x02) + chr(0x60))
+            response = self._Read(9)
+            ok = (
+                len(response) == 9
+                and response[:2] == chr(0x02) + chr(0x60)
+                and response[-1] == chr(0x06)
+            )
+            if ok:
+                self.imInfo = [ord(c) for c in response[2:8]]
+                self.missedReads = 0
+            else:
+                self.flushInput()
+            return ok
+        finally:
+            self.lock.release()
+
+    def _ResetIm(self):
+        # Reset IM: 0x02 0x67 -> 0x02 0x67 0x06, clears the modem link database
+        self.flushInput()
+        self._Write(chr(0x02) + chr(0x67))
+        response = self._Read(3)
+        return response == chr(0x02) + chr(0x67) + chr(0x06)
+
+    def Recover(self):
+        self.lock.acquire()
+        try:
+            self._Lost()
+            if not self._OpenOnce():
+                self._Backoff(False)
+                return False
+            ok = self.Probe()
+            if (not ok) and self.allowImReset:
+                if self.verbose:
+                    print "WARNING: resetting unresponsive PLM on", self.port
+                ok = self._ResetIm() and self.Probe()
+            self._SetHealthy(ok)
+            self._Backoff(ok)
+            return ok
+        finally:
+            self.lock.release()
+
+    def _Backoff(self, recovered):
+        # the watchdog retries a failed recovery after a growing delay
+        if recovered:
+            self.recoverDelay = 0.0
+        else:
+            self.recoverDelay = min(
+                max(self.recoverDelay * 2, self.recoverInterval), self.probeInterval
+            )
+        self.nextRecover = time.time() + self.recoverDelay
+
+    def Acquire(self, timeout=None):
+        if timeout is not None:
+            deadline = time.time() + timeout
+        self.ready.acquire()
+        try:
+            while not self.healthy:
+                if timeout is None:
+                    self.ready.wait(1.0)
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return False
+                    self.ready.wait(remaining)
+        finally:
+            self.ready.release()
+        self.lock.acquire()
+        return True
+
+    def Release(self):
+        self.lock.release()
+
+    def _Check(self):
+        devId = self._DevId()
+        if self.ser is None:
+            # wait for the device path to come back, then reopen, backing off
+            # while it is there but won't open
+            present = (devId is not None) or not self.port.startswith("/")
+            if present and (time.time() >= self.nextRecover):
+                self.Recover()
+        elif self.port.startswith("/") and devId <> self.devId:
+            # unplugged or re-enumerated under the same name
+            if devId is None:
+                self.lock.acquire()
+                self._Lost()
+                self.lock.release()
+            else:
+                self.Recover()
+        elif not self.healthy:
+            # the last recovery failed, keep trying while the port is open
+            if time.time() >= self.nextRecover:
+                self.Recover()
+        elif (self.missedReads >= self.missedLimit) or (
+            time.time() - self.lastActivity > self.probeInterval
+        ):
+            # only probe between transactions, never in the middle of one
+            if self.lock.acquire(False):
+                try:
+                    if not self.Probe():
+                        self.Recover()
+                    else:
+                        self._SetHealthy(True)
+                        self.lastActivity = time.time()
+                finally:
+                    self.lock.release()
+
+    def _Watchdog(self):
+        while self.running:
+            try:
+                self._Check()
+            except Exception, e:
+                if self.verbose:
+                    print "ERROR: PLM watchdog: " + str(e)
+            time.sleep(self.pollInterval)
+
+    def Start(self):
+        if self.watchdog is None:
+            self.running = True
+            self.watchdog = threading.Thread(target=self._Watchdog)
+            self.watchdog.daemon = True
+            self.watchdog.start()
+
+    def Stop(self):
+        self.running = False
+        if self.watchdog is not None:
+            self.watchdog.join()
+            self.watchdog = None
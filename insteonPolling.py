@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+ Insteon Polling
+ provides an adaptive poll scheduler for the device classes in
+ insteonDeviceClasses.  Each device is polled with GetState at its own
+ interval, which narrows while the device keeps changing and widens while
+ it stays the same, always within the scheduler bounds.
+
+ Classes:
+    pollScheduler: adaptive per-device GetState scheduler
+
+ History:
+    October 2026 - first version
+ """
+
+from insteonDeviceClasses import thermostat, clock
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+
+def PollState(device):
+    # returns a tuple of the values a poll reads back so that two polls can
+    # be compared to see if anything changed
+    if isinstance(device, thermostat):
+        return (
+            device.mode,
+            device.targetHeat,
+            device.targetCool,
+            device.actualTemp,
+            device.actualHumi,
+        )
+    else:
+        return (device.lastGetOn, device.lastGetLevel)
+
+
+class pollScheduler:
+    """
+    Adaptive poll scheduler for Insteon devices
+    Devices which changed since their last poll have their interval divided
+    by shrink, devices which didn't have it multiplied by growth.  A device
+    whose errorStatus or manualOverride goes True is polled right away, and
+    polls are never closer together than spacing so that a group of devices
+    falling due together is spread out instead of sent as a burst.
+
+    VALUES:
+    minInterval:
+        shortest poll interval in seconds (default 10)
+    maxInterval:
+        longest poll interval in seconds (default 600)
+    spacing:
+        minimum time between any two polls in seconds (default 1)
+    growth:
+        interval multiplier after a poll with no change (default 1.5)
+    shrink:
+        interval divisor after a poll with a change (default 2)
+    fast:
+        True polls thermostats with GetState(fast=True), a single
+        extended data request instead of four (default True)
+    entries:
+        list of the per-device schedule dictionaries with keys device,
+        interval, next, state, errorStatus, manualOverride, polls, changes
+
+    METHODS:
+    Add(device, interval)
+        adds a device, starting at interval (minInterval if omitted)
+    Remove(device)
+        removes a device
+    Step(PLM)
+        polls the most overdue device if one is due, returns the number of
+        seconds until the next poll is due
+    Run(PLM, duration)
+        polls devices as they fall due for duration seconds (forever if
+        omitted)
+    """
+
+    def __init__(
+        self,
+        minInterval=10.0,
+        maxInterval=600.0,
+        spacing=1.0,
+        growth=1.5,
+        shrink=2.0,
+        fast=True,
+    ):
+        self.minInterval = float(minInterval)
+        self.maxInterval = float(maxInterval)
+        self.spacing = float(spacing)
+        self.growth = float(growth)
+        self.shrink = float(shrink)
+        self.fast = fast
+        self.entries = []
+        self.lastPoll = 0.0
+
+    def Add(self, device, interval=None):
+        if interval is None:
+            interval = self.minInterval
+        interval = min(max(float(interval), self.minInterval), self.maxInterval)
+        # stagger the first polls so a freshly loaded fleet isn't polled at once
+        now = clock.time()
+        if self.entries:
+            first = max(now, max(entry["next"] for entry in self.entries) + self.spacing)
+        else:
+            first = now
+        self.entries.append(
+            {
+                "device": device,
+                "interval": interval,
+                "next": first,
+                "state": None,
+                "errorStatus": device.errorStatus,
+                "manualOverride": getattr(device, "manualOverride", False),
+                "polls": 0,
+                "changes": 0,
+            }
+        )
+
+    def Remove(self, device):
+        self.entries = [entry for entry in self.entries if entry["device"] is not device]
+
+    def _CheckFlags(self, entry, now):
+        # a command outside of the scheduler failed or found an override,
+        # so poll right away
+        device = entry["device"]
+        manualOverride = getattr(device, "manualOverride", False)
+        if (device.errorStatus and not entry["errorStatus"]) or (
+            manualOverride and not entry["manualOverride"]
+        ):
+            entry["interval"] = self.minInterval
+            entry["next"] = min(entry["next"], now)
+        entry["errorStatus"] = device.errorStatus
+        entry["manualOverride"] = manualOverride
+
+    def _Poll(self, plmSerial, entry, now):
+        device = entry["device"]
+        if self.fast and isinstance(device, thermostat):
+            device.GetState(plmSerial, fast=True)
+        else:
+            device.GetState(plmSerial)
+        entry["polls"] += 1
+        state = PollState(device)
+        manualOverride = getattr(device, "manualOverride", False)
+        if device.errorStatus:
+            # try again soon, but don't let a dead device hog the schedule
+            entry["interval"] = self.minInterval
+        elif manualOverride and not entry["manualOverride"]:
+            # someone is at the switch, follow along closely
+            entry["interval"] = self.minInterval
+            entry["changes"] += 1
+        elif (entry["state"] is not None) and (state <> entry["state"]):
+            entry["interval"] = max(entry["interval"] / self.shrink, self.minInterval)
+            entry["changes"] += 1
+        else:
+            entry["interval"] = min(entry["interval"] * self.growth, self.maxInterval)
+        if not device.errorStatus:
+            entry["state"] = state
+        entry["errorStatus"] = device.errorStatus
+        entry["manualOverride"] = manualOverride
+        entry["next"] = now + entry["interval"]
+
+    def Step(self, plmSerial):
+        if not self.entries:
+            return self.maxInterval
+        now = clock.time()
+        for entry in self.entries:
+            self._CheckFlags(entry, now)
+        entry = min(self.entries, key=lambda entry: entry["next"])
+        due = max(entry["next"], self.lastPoll + self.spacing)
+        if due > now:
+            return due - now
+        self.lastPoll = now
+        self._Poll(plmSerial, entry, now)
+        entry = min(self.entries, key=lambda entry: entry["next"])
+        return max(max(entry["next"], self.lastPoll + self.spacing) - clock.time(), 0.0)
+
+    def Run(self, plmSerial, duration=None):
+        if duration is not None:
+            stop = clock.time() + duration
+        while (duration is None) or (clock.time() < stop):
+            wait = self.Step(plmSerial)
+            if duration is not None:
+                wait = min(wait, stop - clock.time())
+            if wait > 0:
+                clock.sleep(wait)
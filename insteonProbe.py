@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+ Insteon Device Probe
+ identifies devices from their address alone.  An ID Request (cmd1 0x10)
+ makes a device answer with a broadcast like the one sent when its SET
+ button is pressed, where the to address holds the device category,
+ subcategory and firmware version.  The requests are pipelined: the next
+ address is sent as soon as the PLM has taken the last one, with up to
+ window requests waiting for their answer, so a site of a hundred devices
+ is identified in seconds.  The answers are cached by address, optionally
+ in a JSON file, and used to create the dimmer or thermostat instances.
+
+ Classes:
+    deviceProbe: pipelined ID requests and device creation
+
+ History:
+    October 2026 - first version
+ """
+
+import json, os, time
+from insteonDeviceClasses import (
+    dimmer,
+    thermostat,
+    ReadMessage,
+    stdMessage,
+    AddressText,
+)
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+# device category to the class that drives it
+deviceCategories = {
+    0x01: dimmer,  # dimmable lighting control
+    0x05: thermostat,  # climate control
+}
+
+
+class deviceProbe:
+    """
+    Pipelined ID requests to identify devices
+
+    VALUES:
+    plmSerial:
+        serial port handle of the PLM (or a plmConnection)
+    cacheFile:
+        JSON file the identities are loaded from and saved to, None to keep
+        them in memory only
+    cache:
+        dictionary by address text (e.g. "00.2B.8E") of [category,
+        subcategory, firmware]
+    window:
+        most requests waiting for an answer at once (default 8)
+    replyTimeout:
+        seconds to wait for the answer to a request (default 3)
+    retries:
+        times a request is sent again if there was no answer (default 1)
+    busyRetries:
+        times a request is sent again to a busy PLM (default 20)
+    acquireTimeout:
+        seconds to wait for a plmConnection (insteonPlm) to be ready before
+        giving up on the whole Probe() (default 30)
+    failed:
+        address texts of the last Probe() that got no answer
+    verbose:
+        True prints a lot of debugging text to stdout while False suppresses
+
+    METHODS:
+    Probe(addresses, force)
+        identifies the addresses not already in the cache (all of them with
+        force=True), returns a dictionary by address text of the identity of
+        every address that is known.  The addresses that didn't answer, or
+        were never asked because the PLM wasn't ready, are left in failed
+    Create(addresses, force)
+        list of dimmer and thermostat instances for the addresses whose
+        category has a class in deviceCategories
+    Save()
+        writes the cache to cacheFile
+    """
+
+    pollTimeout = 0.05
+
+    def __init__(self, plmSerial, cacheFile=None):
+        self.plmSerial = plmSerial
+        self.cacheFile = cacheFile
+        self.cache = {}
+        self.window = 8
+        self.replyTimeout = 3.0
+        self.retries = 1
+        self.busyRetries = 20
+        self.acquireTimeout = 30.0
+        self.failed = []
+        self.verbose = False
+        self.waiting = {}
+        if (cacheFile is not None) and os.path.exists(cacheFile):
+            cache = open(cacheFile, "r")
+            try:
+                self.cache = json.load(cache)
+            finally:
+                cache.close()
+
+    def Save(self):
+        if self.cacheFile is not None:
+            cache = open(self.cacheFile, "w")
+            try:
+                json.dump(self.cache, cache, indent=1, sort_keys=True)
+            finally:
+                cache.close()
+
+    def _Request(self, address):
+        # ID Request, returns True once the PLM has taken it, False if the
+        # PLM was busy and None if it didn't answer at all
+        tempStr = (
+            chr(0x02)
+            + chr(0x62)
+            + chr(address[0])
+            + chr(address[1])
+            + chr(address[2])
+            + chr(0x0F)
+            + chr(0x10)
+            + chr(0x00)
+        )
+        self.plmSerial.write(tempStr)
+        while True:
+            message = ReadMessage(self.plmSerial)
+            if not message:
+                return None
+            if message[:8] == tempStr:
+                # PLM echo, 0x06 accepted, 0x15 busy
+                return message[-1] == chr(0x06)
+            self._Handle(message)
+
+    def _Handle(self, message):
+        # keeps the identity from a SET button style broadcast of a device
+        # that is waiting for an answer
+        view = stdMessage(message)
+        if not view.valid or (view.messageType <> 0x80):
+            return
+        if view.cmd1 not in [0x01, 0x02]:
+            return
+        key = AddressText(view.fromAddress)
+        if key in self.waiting:
+            self.cache[key] = view.toAddress
+            del self.waiting[key]
+            if self.verbose:
+                print "    probe", key, "category", hex(view.toAddress[0])
+
+    def _Failed(self, address):
+        key = AddressText(address)
+        if key not in self.failed:
+            self.failed.append(key)
+        if self.verbose:
+            print "    probe", key, "no answer"
+
+    def _Known(self, addresses):
+        return dict(
+            (AddressText(address), self.cache[AddressText(address)])
+            for address in addresses
+            if AddressText(address) in self.cache
+        )
+
+    def Probe(self, addresses, force=False):
+        plmSerial = self.plmSerial
+        queue = [
+            [list(address), self.retries, self.busyRetries]
+            for address in addresses
+            if force or (AddressText(address) not in self.cache)
+        ]
+        self.failed = []
+        managed = hasattr(plmSerial, "Acquire")
+        if managed and not plmSerial.Acquire(self.acquireTimeout):
+            # the PLM never came ready, nothing was asked
+            for [address, retries, busyLeft] in queue:
+                self._Failed(address)
+            return self._Known(addresses)
+        savedTimeout = plmSerial.timeout
+        try:
+            plmSerial.flushInput()
+            plmSerial.flushOutput()
+            # address text to [address, retries left, busy retries left,
+            # deadline]
+            self.waiting = {}
+            while queue or self.waiting:
+                now = time.time()
+                for key in list(self.waiting):
+                    [address, retries, busyLeft, deadline] = self.waiting[key]
+                    if now > deadline:
+                        del self.waiting[key]
+                        if retries > 0:
+                            queue.append([address, retries - 1, busyLeft])
+                        else:
+                            self._Failed(address)
+                if queue and len(self.waiting) < self.window:
+                    [address, retries, busyLeft] = queue.pop(0)
+                    plmSerial.timeout = self.replyTimeout
+                    accepted = self._Request(address)
+                    if accepted:
+                        self.waiting[AddressText(address)] = [
+                            address,
+                            retries,
+                            busyLeft,
+                            time.time() + self.replyTimeout,
+                        ]
+                    elif accepted is None:
+                        if retries > 0:
+                            queue.append([address, retries - 1, busyLeft])
+                        else:
+                            self._Failed(address)
+                    elif busyLeft > 0:
+                        # the PLM is busy sending, wait a little and resend
+                        queue.insert(0, [address, retries, busyLeft - 1])
+                        time.sleep(self.pollTimeout)
+                    else:
+                        self._Failed(address)
+                    continue
+                plmSerial.timeout = self.pollTimeout
+                message = ReadMessage(plmSerial)
+                if message:
+                    self._Handle(message)
+        finally:
+            plmSerial.timeout = savedTimeout
+            if managed:
+                plmSerial.Release()
+        self.Save()
+        return self._Known(addresses)
+
+    def Create(self, addresses, force=False):
+        identities = self.Probe(addresses, force)
+        devices = []
+        for address in addresses:
+            identity = identities.get(AddressText(address))
+            if identity is None:
+                continue
+            deviceClass = deviceCategories.get(identity[0])
+            if deviceClass is not None:
+                devices.append(deviceClass(list(address)))
+        return devices
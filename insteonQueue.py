@@ -0,0 +1,538 @@
+#!/usr/bin/env python
+"""
+ Insteon Command Queue
+ provides a command queue in front of the PLM for the device classes in
+ insteonDeviceClasses.  Commands waiting in the queue for the same device
+ and setting the same thing are merged, the last one submitted wins, and
+ dimmer sets which match the confirmed state of the device are skipped.
+
+ Classes:
+    pendingCommand: a command waiting in, or completed by, the queue
+    commandQueue: coalescing command queue which owns the PLM handle
+    deferredVerifier: fire-and-forget dimmer sets verified afterwards
+
+ History:
+    October 2026 - first version
+ """
+
+import threading, time
+from insteonDeviceClasses import dimmer, ReadMessage, stdMessage, clock
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+# commands which set or get the same thing on a device and so can be
+# merged while waiting in the queue.  Anything not listed here, such as
+# UpSetPoint, is relative and is always sent as submitted.
+coalesceGroups = {
+    "SetOn": "level",
+    "SetOff": "level",
+    "SetFastOn": "level",
+    "SetFastOff": "level",
+    "SetInstant": "level",
+    "SetOnAtRamp": "level",
+    "SetOffAtRamp": "level",
+    "SetMode": "mode",
+    "SetHeatSetpoint": "targetHeat",
+    "SetCoolSetpoint": "targetCool",
+    "SetSchedule": "schedule",
+    "SetTime": "time",
+    "SyncTime": "time",
+    "GetState": "GetState",
+    "GetSchedule": "GetSchedule",
+    "GetTime": "GetTime",
+}
+
+
+def DimmerTarget(method, args, kwargs):
+    # returns [on, level] that a dimmer set command leaves the dimmer at,
+    # or None if the command isn't one that can be checked against the
+    # confirmed state (the ramp rate commands change the transition too)
+    if method in ["SetOn", "SetFastOn"]:
+        if args:
+            level = args[0]
+        else:
+            level = kwargs.get("level", 100)
+        return [True, level]
+    elif method in ["SetOff", "SetFastOff"]:
+        return [False, 0]
+    elif method == "SetInstant":
+        if args:
+            level = args[0]
+        else:
+            level = kwargs["level"]
+        return [level > 0, level]
+    return None
+
+
+class pendingCommand:
+    """
+    A command submitted to a commandQueue
+
+    VALUES:
+    device:
+        the dimmer or thermostat instance
+    method:
+        name of the device method to call, e.g. "SetOn"
+    args, kwargs:
+        arguments passed to the method after the PLM handle
+    force:
+        True sends the command even if it matches the confirmed state
+    merged:
+        number of later submissions merged into this command
+    skipped:
+        True if the command was not sent because the device was already
+        in the requested state
+    error:
+        errorStatus of the device after the command was sent
+    done:
+        threading.Event set once the command has been sent or skipped
+
+    METHODS:
+    Wait(timeout)
+        waits for the command to complete, returns True if it did
+    """
+
+    def __init__(self, device, method, args, kwargs, force):
+        self.device = device
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.force = force
+        self.merged = 0
+        self.skipped = False
+        self.error = False
+        self.done = threading.Event()
+
+    def Wait(self, timeout=None):
+        self.done.wait(timeout)
+        return self.done.isSet()
+
+
+class commandQueue:
+    """
+    Coalescing command queue for the PLM
+    Submit() queues a device method call and returns its pendingCommand.
+    If a command from the same coalesce group is already waiting for that
+    device, its arguments are replaced by the new ones and the same
+    pendingCommand is returned, so the final value is sent once, in the
+    place of the first submission.  Dispatch() sends everything waiting,
+    either called directly or from the worker thread started by Start().
+
+    VALUES:
+    plmSerial:
+        serial port handle of the PLM, only used by the queue
+    freshness:
+        age in seconds of a dimmer's last GetState() readback for it to
+        confirm the state and let a matching set be skipped (default 30)
+    pending:
+        list of pendingCommand waiting to be sent
+    holdTimeout:
+        seconds Dispatch() waits for a plmConnection (insteonPlm) to be
+        ready before returning with the commands still held (default 1)
+    nSent, nMerged, nSkipped:
+        counts of the commands sent, merged and skipped
+
+    METHODS:
+    Submit(device, method, *args, **kwargs)
+        queues device.method(PLM, *args, **kwargs), force=True in kwargs
+        sends it even when it matches the confirmed state
+    Dispatch()
+        sends every waiting command, returns the list of those completed.
+        A command whose device method raises completes with error True
+    Cancel(command)
+        takes a command that is still waiting off the queue and marks it as
+        an error, returns True if it was still waiting
+    Start()
+        starts a worker thread which dispatches as commands arrive
+    Stop()
+        stops the worker thread
+    """
+
+    def __init__(self, plmSerial, freshness=30.0):
+        self.plmSerial = plmSerial
+        self.freshness = freshness
+        self.holdTimeout = 1.0
+        self.pending = []
+        self.nSent = 0
+        self.nMerged = 0
+        self.nSkipped = 0
+        self.condition = threading.Condition()
+        self.worker = None
+        self.running = False
+
+    def Submit(self, device, method, *args, **kwargs):
+        force = kwargs.pop("force", False)
+        group = coalesceGroups.get(method)
+        self.condition.acquire()
+        try:
+            if group is not None:
+                for command in self.pending:
+                    if (command.device is device) and (
+                        coalesceGroups.get(command.method) == group
+                    ):
+                        # last writer wins, keeping the place in the queue
+                        command.method = method
+                        command.args = args
+                        command.kwargs = kwargs
+                        command.force = command.force or force
+                        command.merged += 1
+                        self.nMerged += 1
+                        return command
+            command = pendingCommand(device, method, args, kwargs, force)
+            self.pending.append(command)
+            self.condition.notify()
+            return command
+        finally:
+            self.condition.release()
+
+    def _Confirmed(self, command):
+        # True if a dimmer set would not change anything: the last set and a
+        # fresh readback both agree with the requested state
+        device = command.device
+        if command.force or not isinstance(device, dimmer):
+            return False
+        target = DimmerTarget(command.method, command.args, command.kwargs)
+        if target is None:
+            return False
+        [on, level] = target
+        if device.errorStatus or device.manualOverride:
+            return False
+        if clock.time() - device.lastUpdate > self.freshness:
+            return False
+        if (device.lastSetOn <> on) or (device.lastGetOn <> on):
+            return False
+        if on:
+            # same 2% slop as the manual override test in GetState
+            return (abs(device.lastSetLevel - level) <= 2) and (
+                abs(device.lastGetLevel - level) <= 2
+            )
+        return True
+
+    def _Send(self, command):
+        # returns False if the command is held because the PLM connection
+        # isn't ready, or went away while the command was being sent
+        if self._Confirmed(command):
+            command.skipped = True
+            self.nSkipped += 1
+            command.done.set()
+            return True
+        managed = hasattr(self.plmSerial, "Acquire")
+        if managed and not self.plmSerial.Acquire(self.holdTimeout):
+            return False
+        try:
+            getattr(command.device, command.method)(
+                self.plmSerial, *command.args, **command.kwargs
+            )
+        finally:
+            if managed:
+                self.plmSerial.Release()
+        if managed and not self.plmSerial.healthy:
+            return False
+        command.error = command.device.errorStatus
+        self.nSent += 1
+        command.done.set()
+        return True
+
+    def Dispatch(self):
+        self.condition.acquire()
+        try:
+            commands = self.pending
+            self.pending = []
+        finally:
+            self.condition.release()
+        for iCommand in range(len(commands)):
+            command = commands[iCommand]
+            try:
+                sent = self._Send(command)
+            except Exception, e:
+                # a device method that raises fails its own command only, the
+                # rest of the batch and the worker thread carry on
+                command.device._Report(command.method + " raised " + str(e), True)
+                command.error = True
+                command.done.set()
+                sent = True
+            if not sent:
+                # hold the rest, in order, ahead of anything submitted since
+                self.condition.acquire()
+                self.pending = commands[iCommand:] + self.pending
+                self.condition.release()
+                return commands[:iCommand]
+        return commands
+
+    def Cancel(self, command):
+        self.condition.acquire()
+        try:
+            if command not in self.pending:
+                return False
+            self.pending.remove(command)
+            command.error = True
+            return True
+        finally:
+            self.condition.release()
+
+    def _Worker(self):
+        while self.running:
+            self.condition.acquire()
+            try:
+                while self.running and not self.pending:
+                    self.condition.wait(1.0)
+            finally:
+                self.condition.release()
+            if self.running:
+                self.Dispatch()
+
+    def Start(self):
+        if self.worker is None:
+            self.running = True
+            self.worker = threading.Thread(target=self._Worker)
+            self.worker.daemon = True
+            self.worker.start()
+
+    def Stop(self):
+        self.condition.acquire()
+        self.running = False
+        self.condition.notify()
+        self.condition.release()
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
+
+
+class deferredVerifier:
+    """
+    Fire-and-forget dimmer sets with deferred verification
+    Set() sends a dimmer set command and returns as soon as the PLM echoes
+    its ACK, without waiting for the reply from the dimmer.  The verifier
+    stands in for the PLM serial handle while it does so, keeping any
+    device replies which arrive in the meantime, so a whole scene can be
+    sent at PLM speed.  Check() matches the replies against the sets still
+    pending, re-sends those that were NAKed or not answered within
+    replyTimeout, and after retries re-sends moves them to the unverified
+    list and sets the errorStatus of the device.  A status request (0x19)
+    sent through the verifier, such as the probe of a device breaker (see
+    EnableBreakers), isn't one of the sets: its reply goes to the caller.
+
+    VALUES:
+    plmSerial:
+        serial port handle of the PLM
+    replyTimeout:
+        seconds to wait for a device reply before re-sending (default 2)
+    retries:
+        number of times an unanswered set is re-sent (default 1)
+    pending:
+        list of dictionaries for the sets waiting for their reply, with
+        keys device, method, args, kwargs, cmd1, cmd2, sent, attempts,
+        failed and superseded.  A set replaced by a newer one to the same
+        device stays (superseded, never re-sent) until its own reply has
+        arrived or replyTimeout has passed, so that a late reply to it
+        isn't taken for the reply to the newer set
+    unverified:
+        the pending dictionaries of sets which were never confirmed
+    nConfirmed:
+        number of sets confirmed by a device reply
+
+    METHODS:
+    Set(device, method, *args, **kwargs)
+        sends device.method(PLM, *args, verify=False, **kwargs)
+    Check()
+        reads the replies that have arrived, re-sends or gives up on the
+        overdue sets, returns the number still pending
+    Verify(timeout)
+        calls Check() until nothing is pending (or timeout seconds have
+        passed), returns the unverified list
+    Start()
+        starts a thread that calls Check() in the background
+    Stop()
+        stops the background thread
+    """
+
+    drainTimeout = 0.05
+
+    def __init__(self, plmSerial, replyTimeout=2.0, retries=1):
+        self.plmSerial = plmSerial
+        self.replyTimeout = replyTimeout
+        self.retries = retries
+        self.pending = []
+        self.unverified = []
+        self.nConfirmed = 0
+        self.lastFrame = ""
+        self.statusFrom = None
+        self.lock = threading.RLock()
+        self.worker = None
+        self.running = False
+
+    # serial handle interface used by the device methods during Set()
+    def write(self, data):
+        if (len(data) == 8) and (data[1] == chr(0x62)) and (data[6] == chr(0x19)):
+            self.statusFrom = [ord(c) for c in data[2:5]]
+        else:
+            self.lastFrame = data
+        return self.plmSerial.write(data)
+
+    def read(self, size=1):
+        # the device method only waits for the echo of its command, device
+        # replies to earlier sets that arrive first are kept for Check()
+        while True:
+            message = ReadMessage(self.plmSerial)
+            if not message:
+                self.statusFrom = None
+                return ""
+            if message[1] == chr(0x62):
+                return message[:size]
+            if self._StatusReply(message):
+                self.statusFrom = None
+                return message[:size]
+            self._Match(message)
+
+    def _StatusReply(self, message):
+        # True for the reply to a status request written through the
+        # verifier, it would otherwise be taken for the reply to a set
+        if self.statusFrom is None:
+            return False
+        view = stdMessage(message)
+        return (
+            view.valid
+            and (view.isAck or view.isNak)
+            and (view.fromAddress == self.statusFrom)
+        )
+
+    def flushInput(self):
+        # collect what has arrived instead of throwing it away
+        self._Collect()
+
+    def flushOutput(self):
+        self.plmSerial.flushOutput()
+
+    def __getattr__(self, name):
+        return getattr(self.plmSerial, name)
+
+    def _Match(self, message):
+        view = stdMessage(message)
+        if not (view.valid and (view.isAck or view.isNak)):
+            return
+        fromAddress = view.fromAddress
+        # the oldest set with the same command, one with the same cmd2
+        # (the level for an on) first
+        candidates = [
+            entry
+            for entry in self.pending
+            if (entry["device"].address == fromAddress)
+            and (entry["cmd1"] == view.cmd1)
+        ]
+        if not candidates:
+            return
+        same = [entry for entry in candidates if entry["cmd2"] == view.cmd2]
+        entry = (same or candidates)[0]
+        if view.isAck or entry["superseded"]:
+            self.pending.remove(entry)
+            if view.isAck and not entry["superseded"]:
+                self.nConfirmed += 1
+        else:
+            entry["failed"] = True
+
+    def _Collect(self):
+        savedTimeout = self.plmSerial.timeout
+        self.plmSerial.timeout = self.drainTimeout
+        try:
+            message = ReadMessage(self.plmSerial)
+            while message:
+                self._Match(message)
+                message = ReadMessage(self.plmSerial)
+        finally:
+            self.plmSerial.timeout = savedTimeout
+
+    def _Send(self, entry):
+        managed = hasattr(self.plmSerial, "Acquire")
+        if managed and not self.plmSerial.Acquire(self.replyTimeout):
+            entry["failed"] = True
+            return
+        try:
+            self.lastFrame = ""
+            kwargs = dict(entry["kwargs"])
+            kwargs["verify"] = False
+            getattr(entry["device"], entry["method"])(self, *entry["args"], **kwargs)
+        finally:
+            if managed:
+                self.plmSerial.Release()
+        if len(self.lastFrame) >= 8:
+            entry["cmd1"] = ord(self.lastFrame[6])
+            entry["cmd2"] = ord(self.lastFrame[7])
+        entry["sent"] = time.time()
+        entry["attempts"] += 1
+        entry["failed"] = entry["device"].errorStatus
+
+    def Set(self, device, method, *args, **kwargs):
+        entry = {
+            "device": device,
+            "method": method,
+            "args": args,
+            "kwargs": kwargs,
+            "cmd1": None,
+            "cmd2": None,
+            "sent": 0,
+            "attempts": 0,
+            "failed": False,
+            "superseded": False,
+        }
+        self.lock.acquire()
+        try:
+            # a newer set to the same device replaces one still pending
+            for old in self.pending:
+                if old["device"] is device:
+                    old["superseded"] = True
+            self._Send(entry)
+            self.pending.append(entry)
+        finally:
+            self.lock.release()
+        return entry
+
+    def Check(self):
+        self.lock.acquire()
+        try:
+            self._Collect()
+            now = time.time()
+            for entry in list(self.pending):
+                if entry["superseded"]:
+                    # only kept to take its own late reply
+                    if now - entry["sent"] > self.replyTimeout:
+                        self.pending.remove(entry)
+                elif entry["failed"] or (now - entry["sent"] > self.replyTimeout):
+                    if entry["attempts"] <= self.retries:
+                        self._Send(entry)
+                    else:
+                        self.pending.remove(entry)
+                        self.unverified.append(entry)
+                        entry["device"]._Report(entry["method"] + " unverified", True)
+            return len([entry for entry in self.pending if not entry["superseded"]])
+        finally:
+            self.lock.release()
+
+    def Verify(self, timeout=None):
+        if timeout is not None:
+            stop = time.time() + timeout
+        while self.Check() and ((timeout is None) or (time.time() < stop)):
+            time.sleep(self.drainTimeout)
+        return self.unverified
+
+    def _Worker(self):
+        while self.running:
+            if self.pending:
+                self.Check()
+            time.sleep(0.1)
+
+    def Start(self):
+        if self.worker is None:
+            self.running = True
+            self.worker = threading.Thread(target=self._Worker)
+            self.worker.daemon = True
+            self.worker.start()
+
+    def Stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join()
+            self.worker = None
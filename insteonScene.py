@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+"""
+ Insteon Scenes
+ provides a snapshot of the state of a set of dimmers and thermostats
+ which can be restored later, for example after a party mode or a power
+ outage.  The restore only sends commands to the devices which differ from
+ the snapshot, and uses PLM group commands where a whole group needs the
+ same change.
+
+ Classes:
+    sceneSnapshot: captured dimmer and thermostat state with minimal restore
+
+ History:
+    October 2026 - first version
+ """
+
+from insteonDeviceClasses import dimmer, thermostat, GroupCmd, AddressText, clock
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+# thermostat readback mode (see thermostat.modeTextArray) to the SetMode
+# value which puts the thermostat back in that mode
+restoreModes = {
+    0: 0x09,  # Off -> Off All
+    1: 0x04,  # Heat -> On Heat
+    2: 0x05,  # Cool -> On Cool
+    3: 0x06,  # Auto -> Manual Auto
+    4: 0x07,  # Fan -> On Fan
+    5: 0x0A,  # Program -> Auto
+    6: 0x0A,  # Program Heat -> Auto
+    7: 0x0A,  # Program Cool -> Auto
+}
+
+
+def DimmerState(device):
+    # [on, level] the dimmer is believed to be at.  Until GetState reports a
+    # manual override the last set is the newest information, after that it
+    # is the readback.
+    if device.manualOverride:
+        return [device.lastGetOn, device.lastGetLevel]
+    else:
+        return [device.lastSetOn, device.lastSetLevel]
+
+
+def SameDimmerState(a, b):
+    # True if two [on, level] states match, with the 2% slop of GetState
+    if a[0] <> b[0]:
+        return False
+    return (not a[0]) or (abs(a[1] - b[1]) <= 2)
+
+
+class sceneSnapshot:
+    """
+    Snapshot of dimmer on/level and thermostat mode/setpoints
+
+    VALUES:
+    entries:
+        list of dictionaries, one per device, with keys device and either
+        on and level (dimmer) or mode, targetHeat and targetCool (thermostat)
+    groups:
+        list of [group, devices, onLevel] of the PLM ALL-Link groups that can
+        be used for the restore
+    time:
+        host clock.time() of the capture
+    unread:
+        list of the devices left out of the last Capture() because they
+        had never been read, so only their defaults were known
+    unrestored:
+        list of [device, field, value] that the last Restore() could not set
+    verbose:
+        True prints a lot of debugging text to stdout while False suppresses
+
+    METHODS:
+    Capture(devices, PLM, maxAge)
+        records the state of the devices.  With a PLM, devices never read
+        and those whose last readback is older than maxAge seconds are read
+        first.  Devices still never read are left out and listed in unread
+    AddGroup(group, devices, onLevel)
+        adds a PLM ALL-Link group whose responders are the dimmers in
+        devices, linked to turn on at onLevel percent
+    Restore(PLM, maxAge)
+        sends the commands needed to put the devices back to the snapshot,
+        returns the number of commands sent
+    """
+
+    def __init__(self):
+        self.entries = []
+        self.groups = []
+        self.time = 0
+        self.unread = []
+        self.unrestored = []
+        self.verbose = False
+
+    def _Refresh(self, devices, plmSerial, maxAge):
+        if plmSerial is None:
+            return
+        now = clock.time()
+        for device in devices:
+            if (device.lastUpdate == 0) or (
+                (maxAge is not None) and (now - device.lastUpdate > maxAge)
+            ):
+                if isinstance(device, thermostat):
+                    device.GetState(plmSerial, fast=True)
+                else:
+                    device.GetState(plmSerial)
+
+    def Capture(self, devices, plmSerial=None, maxAge=None):
+        self._Refresh(devices, plmSerial, maxAge)
+        self.entries = []
+        self.unread = []
+        for device in devices:
+            if device.lastUpdate == 0:
+                # the constructor defaults, e.g. a 0C heat setpoint, are not
+                # a state to restore
+                self.unread.append(device)
+                if self.verbose:
+                    print "WARNING: scene capture skips unread device", AddressText(
+                        device.address
+                    )
+            elif isinstance(device, thermostat):
+                self.entries.append(
+                    {
+                        "device": device,
+                        "mode": device.mode,
+                        "targetHeat": device.targetHeat,
+                        "targetCool": device.targetCool,
+                    }
+                )
+            elif isinstance(device, dimmer):
+                [on, level] = DimmerState(device)
+                self.entries.append({"device": device, "on": on, "level": level})
+        self.time = clock.time()
+
+    def AddGroup(self, group, devices, onLevel=100):
+        self.groups.append([group, list(devices), onLevel])
+
+    def Restore(self, plmSerial, maxAge=None):
+        self._Refresh([entry["device"] for entry in self.entries], plmSerial, maxAge)
+        self.unrestored = []
+        nCommands = 0
+
+        # dimmers that are not already where the snapshot wants them
+        changes = {}
+        for entry in self.entries:
+            device = entry["device"]
+            if isinstance(device, dimmer):
+                target = [entry["on"], entry["level"]]
+                if not SameDimmerState(DimmerState(device), target):
+                    changes[id(device)] = [device, target]
+
+        # a group command does the lot when every member of the group is in
+        # the snapshot with the same target and at least two of them differ
+        targets = dict(
+            (id(entry["device"]), [entry["on"], entry["level"]])
+            for entry in self.entries
+            if isinstance(entry["device"], dimmer)
+        )
+        for [group, devices, onLevel] in self.groups:
+            members = [targets.get(id(device)) for device in devices]
+            if None in members:
+                continue
+            if all(not member[0] for member in members):
+                [cmd1, on, level] = [0x13, False, 0]
+            elif all(SameDimmerState(member, [True, onLevel]) for member in members):
+                [cmd1, on, level] = [0x11, True, onLevel]
+            else:
+                continue
+            pending = [device for device in devices if id(device) in changes]
+            if len(pending) < 2:
+                continue
+            if self.verbose:
+                print "    restore group", group, "to", on, level
+            plmSerial.flushInput()
+            plmSerial.flushOutput()
+            [response, localError] = GroupCmd(
+                plmSerial, group, cmd1, int(round(level * 2.55)), self.verbose
+            )
+            nCommands += 1
+            if not localError:
+                for device in devices:
+                    device.lastSetOn = on
+                    device.lastSetLevel = level
+                    device.manualOverride = False
+                    changes.pop(id(device), None)
+
+        # whatever is left, one command per device
+        for entry in self.entries:
+            device = entry["device"]
+            if isinstance(device, dimmer):
+                if id(device) not in changes:
+                    continue
+                if entry["on"]:
+                    device.SetOn(plmSerial, entry["level"])
+                else:
+                    device.SetOff(plmSerial)
+                nCommands += 1
+                if device.errorStatus:
+                    self.unrestored.append([device, "level", entry["level"]])
+            elif isinstance(device, thermostat):
+                if (device.mode <> entry["mode"]) and (entry["mode"] in restoreModes):
+                    device.SetMode(plmSerial, restoreModes[entry["mode"]])
+                    nCommands += 1
+                    if device.errorStatus:
+                        self.unrestored.append([device, "mode", entry["mode"]])
+                    else:
+                        device.mode = entry["mode"]
+                        device.modeText = device.modeTextArray[entry["mode"]]
+                for [field, method] in [
+                    ["targetHeat", device.SetHeatSetpoint],
+                    ["targetCool", device.SetCoolSetpoint],
+                ]:
+                    if getattr(device, field) <> entry[field]:
+                        method(plmSerial, entry[field])
+                        nCommands += 1
+                        if device.errorStatus:
+                            self.unrestored.append([device, field, entry[field]])
+        return nCommands
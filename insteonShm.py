@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+"""
+ Insteon Shared State Table
+ provides a fixed-layout, memory-mapped table of device state.  The one
+ process that owns the PLM writes it and any number of processes read it
+ directly from the mapping, with no IPC round trip.  Each record has a
+ sequence number (a seqlock): the writer makes it odd before changing the
+ record and even again afterwards, and a reader retries if the number was
+ odd or changed while it copied the record.
+
+ File layout (all values little endian):
+    header: 16 bytes
+        8 byte magic "INSTSHM1", uint32 number of records, uint32 record size
+    records: 32 bytes each
+        uint32:  sequence number
+        3 bytes: address, high byte first
+        uint8:   kind, 0 = unused, 1 = dimmer, 2 = thermostat
+        uint8:   flags, see FLAG_*
+        uint8:   dimmer lastGetLevel (percent)
+        uint8:   dimmer lastSetLevel (percent)
+        uint8:   thermostat mode (readback value)
+        int8:    thermostat targetHeat (C)
+        int8:    thermostat targetCool (C)
+        int16:   thermostat actualTemp (0.1C)
+        uint8:   thermostat actualHumi (percent)
+        1 byte:  padding
+        double:  lastUpdate of the device (clock.time() of
+                 insteonDeviceClasses)
+        6 bytes: padding
+
+ Classes:
+    stateTableWriter: creates the table and keeps it up to date
+    stateTableReader: reads the table from another process
+
+ History:
+    October 2026 - first version
+ """
+
+import mmap, struct, threading, time
+from insteonDeviceClasses import (
+    thermostat,
+    Subscribe,
+    Unsubscribe,
+    AddressText,
+)
+
+__author__ = "David Boertjes"
+__license__ = "unlicense"
+__maintainer__ = "David Boertjes"
+__email__ = "david.boertjes@gmail.com"
+__status__ = "Production"
+
+TABLE_MAGIC = "INSTSHM1"
+tableHeader = struct.Struct("<8sII")
+stateRecord = struct.Struct("<I3sBBBBBbbhBxd6x")
+sequenceField = struct.Struct("<I")
+
+KIND_NONE = 0
+KIND_DIMMER = 1
+KIND_THERMOSTAT = 2
+
+FLAG_ON = 0x01  # dimmer lastGetOn
+FLAG_SET_ON = 0x02  # dimmer lastSetOn
+FLAG_OVERRIDE = 0x04  # dimmer manualOverride
+FLAG_ERROR = 0x08  # errorStatus
+
+
+def _Clip(value, low, high):
+    return int(min(max(value, low), high))
+
+
+class stateTableWriter:
+    """
+    Writer of the shared state table, for the process owning the PLM
+    Creates the file with one record per device, in the order given, and
+    rewrites a device record whenever the device emits an event.
+
+    VALUES:
+    fileName:
+        path of the table, e.g. on /dev/shm
+    devices:
+        list of the dimmer and thermostat instances, in record order
+
+    METHODS:
+    Write(device)
+        rewrites the record of device from its current attributes, from
+        any thread
+    Close()
+        stops following events and unmaps the table
+    """
+
+    def __init__(self, fileName, devices):
+        self.fileName = fileName
+        self.devices = list(devices)
+        size = tableHeader.size + stateRecord.size * len(self.devices)
+        tableFile = open(fileName, "w+b")
+        tableFile.write(chr(0) * size)
+        tableFile.flush()
+        self.table = mmap.mmap(tableFile.fileno(), size)
+        tableFile.close()
+        tableHeader.pack_into(
+            self.table, 0, TABLE_MAGIC, len(self.devices), stateRecord.size
+        )
+        self.sequence = [0] * len(self.devices)
+        # events come from the queue worker, the verifier and the caller, a
+        # second writer inside the odd window would let a torn record through
+        self.lock = threading.Lock()
+        for device in self.devices:
+            self.Write(device)
+        self.subscription = Subscribe(self._Event)
+
+    def _Event(self, event):
+        if event.device in self.devices:
+            self.Write(event.device)
+
+    def Write(self, device):
+        iRecord = self.devices.index(device)
+        offset = tableHeader.size + stateRecord.size * iRecord
+        address = "".join(chr(a) for a in device.address)
+        flags = 0
+        if device.errorStatus:
+            flags |= FLAG_ERROR
+        if isinstance(device, thermostat):
+            values = [
+                KIND_THERMOSTAT,
+                flags,
+                0,
+                0,
+                _Clip(device.mode, 0, 255),
+                _Clip(device.targetHeat, -128, 127),
+                _Clip(device.targetCool, -128, 127),
+                _Clip(round(device.actualTemp * 10), -32768, 32767),
+                _Clip(device.actualHumi, 0, 255),
+            ]
+        else:
+            if device.lastGetOn:
+                flags |= FLAG_ON
+            if device.lastSetOn:
+                flags |= FLAG_SET_ON
+            if device.manualOverride:
+                flags |= FLAG_OVERRIDE
+            values = [
+                KIND_DIMMER,
+                flags,
+                _Clip(device.lastGetLevel, 0, 255),
+                _Clip(device.lastSetLevel, 0, 255),
+                0,
+                0,
+                0,
+                0,
+                0,
+            ]
+        # odd sequence number while the record is being changed
+        self.lock.acquire()
+        try:
+            sequence = self.sequence[iRecord]
+            sequenceField.pack_into(self.table, offset, sequence + 1)
+            stateRecord.pack_into(
+                self.table,
+                offset,
+                sequence + 1,
+                address,
+                *(values + [float(device.lastUpdate)])
+            )
+            sequenceField.pack_into(self.table, offset, sequence + 2)
+            self.sequence[iRecord] = sequence + 2
+        finally:
+            self.lock.release()
+
+    def Close(self):
+        Unsubscribe(self.subscription)
+        self.table.close()
+
+
+class stateTableReader:
+    """
+    Reader of the shared state table, for any process
+
+    VALUES:
+    fileName:
+        path of the table written by stateTableWriter
+    nRecords:
+        number of records in the table
+    addresses:
+        list of the address text (e.g. "00.2B.8E") of each record
+
+    METHODS:
+    Read(iRecord)
+        consistent copy of record iRecord as a dictionary, None if the
+        writer kept changing it
+    Lookup(address)
+        Read() of the record for address, given as a list or as text
+    ReadAll()
+        list of Read() of every record
+    Close()
+        unmaps the table
+    """
+
+    retries = 1000
+
+    def __init__(self, fileName):
+        self.fileName = fileName
+        tableFile = open(fileName, "rb")
+        self.table = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+        tableFile.close()
+        [magic, self.nRecords, recordSize] = tableHeader.unpack_from(self.table, 0)
+        if (magic <> TABLE_MAGIC) or (recordSize <> stateRecord.size):
+            raise ValueError("not an Insteon state table: " + fileName)
+        self.addresses = []
+        for iRecord in range(self.nRecords):
+            offset = tableHeader.size + stateRecord.size * iRecord
+            address = self.table[offset + 4 : offset + 7]
+            self.addresses.append(AddressText([ord(c) for c in address]))
+
+    def Read(self, iRecord):
+        offset = tableHeader.size + stateRecord.size * iRecord
+        for attempt in range(self.retries):
+            [before] = sequenceField.unpack_from(self.table, offset)
+            if before & 1:
+                time.sleep(0)
+                continue
+            values = stateRecord.unpack_from(self.table, offset)
+            # the copy is only good if the writer didn't start on the record
+            # while it was taken
+            [after] = sequenceField.unpack_from(self.table, offset)
+            if after == before:
+                break
+        else:
+            return None
+        [
+            sequence,
+            address,
+            kind,
+            flags,
+            level,
+            setLevel,
+            mode,
+            targetHeat,
+            targetCool,
+            temp,
+            humidity,
+            lastUpdate,
+        ] = values
+        record = {
+            "sequence": sequence,
+            "address": AddressText([ord(c) for c in address]),
+            "errorStatus": bool(flags & FLAG_ERROR),
+            "lastUpdate": lastUpdate,
+        }
+        if kind == KIND_THERMOSTAT:
+            record["type"] = "thermostat"
+            record["mode"] = mode
+            record["targetHeat"] = targetHeat
+            record["targetCool"] = targetCool
+            record["actualTemp"] = temp / 10.0
+            record["actualHumi"] = float(humidity)
+        elif kind == KIND_DIMMER:
+            record["type"] = "dimmer"
+            record["lastGetOn"] = bool(flags & FLAG_ON)
+            record["lastGetLevel"] = level
+            record["lastSetOn"] = bool(flags & FLAG_SET_ON)
+            record["lastSetLevel"] = setLevel
+            record["manualOverride"] = bool(flags & FLAG_OVERRIDE)
+        return record
+
+    def Lookup(self, address):
+        if not isinstance(address, str):
+            address = AddressText(address)
+        address = address.upper()
+        if address not in self.addresses:
+            return None
+        return self.Read(self.addresses.index(address))
+
+    def ReadAll(self):
+        return [self.Read(iRecord) for iRecord in range(self.nRecords)]
+
+    def Close(self):
+        self.table.close()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+ tests of the command queue worker (insteonQueue)
+ run from the repository directory: python -m unittest discover tests
+ """
+
+import os, sys, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import insteonQueue
+from insteonDeviceClasses import dimmer
+
+
+class brokenDimmer(dimmer):
+    # a dimmer with one method that raises, as a malformed set can
+    def Explode(self, plmSerial):
+        raise IndexError("list index out of range")
+
+    def Count(self, plmSerial):
+        self.counted = True
+
+
+class workerTest(unittest.TestCase):
+    def setUp(self):
+        self.device = brokenDimmer([0x00, 0x2B, 0x8E])
+        self.device.counted = False
+        self.queue = insteonQueue.commandQueue(None)
+
+    def tearDown(self):
+        self.queue.Stop()
+
+    def testRaiseKeepsBatch(self):
+        failed = self.queue.Submit(self.device, "Explode")
+        later = self.queue.Submit(self.device, "Count")
+        self.queue.Dispatch()
+        self.assertTrue(failed.done.isSet())
+        self.assertTrue(failed.error)
+        self.assertTrue(self.device.errorStatus)
+        self.assertTrue(later.done.isSet())
+        self.assertTrue(self.device.counted)
+
+    def testWorkerSurvives(self):
+        self.queue.Start()
+        self.assertTrue(self.queue.Submit(self.device, "Explode").Wait(2))
+        self.assertTrue(self.queue.worker.is_alive())
+        self.assertTrue(self.queue.Submit(self.device, "Count").Wait(2))
+        self.assertTrue(self.device.counted)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+ tests of the seqlock of the shared state table (insteonShm)
+ run from the repository directory: python -m unittest discover tests
+ """
+
+import os, shutil, sys, tempfile, unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import insteonShm
+from insteonDeviceClasses import dimmer
+
+
+class interleavedRecord:
+    # stands in for insteonShm.stateRecord in the reader: the first copy of
+    # a record is torn, half before and half after a write that the writer
+    # finishes while the copy is taken
+    def __init__(self, writer, device):
+        self.writer = writer
+        self.device = device
+        self.copies = 0
+        self.record = insteonShm.stateRecord
+        self.size = self.record.size
+
+    def unpack_from(self, buf, offset=0):
+        values = self.record.unpack_from(buf, offset)
+        self.copies += 1
+        if self.copies > 1:
+            return values
+        # the writer uses the module stateRecord too
+        insteonShm.stateRecord = self.record
+        self.device.lastGetLevel = 80
+        self.writer.Write(self.device)
+        insteonShm.stateRecord = self
+        newValues = self.record.unpack_from(buf, offset)
+        # old sequence and flags, new levels
+        return values[:4] + newValues[4:]
+
+
+class seqlockTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.device = dimmer([0x00, 0x2B, 0x8E])
+        self.device.lastGetLevel = 20
+        fileName = os.path.join(self.directory, "state.shm")
+        self.writer = insteonShm.stateTableWriter(fileName, [self.device])
+        self.reader = insteonShm.stateTableReader(fileName)
+        self.stateRecord = insteonShm.stateRecord
+
+    def tearDown(self):
+        insteonShm.stateRecord = self.stateRecord
+        self.reader.Close()
+        self.writer.Close()
+        shutil.rmtree(self.directory)
+
+    def testRead(self):
+        record = self.reader.Read(0)
+        self.assertEqual(record["lastGetLevel"], 20)
+        self.assertEqual(record["sequence"] % 2, 0)
+
+    def testWriterInterleaved(self):
+        before = self.reader.Read(0)["sequence"]
+        interleaved = interleavedRecord(self.writer, self.device)
+        insteonShm.stateRecord = interleaved
+        record = self.reader.Read(0)
+        # the torn copy is thrown away and the record read again
+        self.assertEqual(interleaved.copies, 2)
+        self.assertTrue(record["sequence"] > before)
+        self.assertEqual(record["sequence"] % 2, 0)
+        self.assertEqual(record["lastGetLevel"], 80)
+
+
+if __name__ == "__main__":
+    unittest.main()